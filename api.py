@@ -0,0 +1,168 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+from datetime import date, datetime
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from models import Venue, Artist, Show
+from queries import (KeysetPage, artist_shows, artist_summaries, load_profile,
+                     show_rows, venue_shows, venue_summaries)
+
+#----------------------------------------------------------------------------#
+# Read-only JSON API, version 1.
+#----------------------------------------------------------------------------#
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+NDJSON = 'application/x-ndjson'
+
+VENUE_FIELDS = ('id', 'name', 'city', 'state', 'num_upcoming_shows', 'num_past_shows')
+ARTIST_FIELDS = ('id', 'name', 'num_upcoming_shows', 'num_past_shows')
+SHOW_FIELDS = ('id', 'start_time', 'end_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+               'artist_image_link')
+
+
+class BadRequest(Exception):
+    pass
+
+
+@api_v1.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({"error": str(error)}), 400
+
+
+@api_v1.errorhandler(404)
+def not_found(error):
+    return jsonify({"error": "not found"}), 404
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+
+def _fields(available):
+    # ?fields=id,name restricts each object to those keys
+    requested = request.args.get('fields')
+    if not requested:
+        return available
+    fields = tuple(field.strip() for field in requested.split(',') if field.strip())
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise BadRequest(f"unknown fields: {', '.join(unknown)}; available: {', '.join(available)}")
+    return fields
+
+
+def _limit():
+    limit = request.args.get('limit', current_app.config['API_PER_PAGE'], type=int)
+    return min(max(limit, 1), current_app.config['API_MAX_PER_PAGE'])
+
+
+def _wants_ndjson():
+    return (request.args.get('format') == 'ndjson'
+            or request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON)
+
+
+def _select(row, fields):
+    return {field: getattr(row, field) for field in fields}
+
+
+def _respond(query, keys, types, fields):
+    # A keyset page as JSON, or with ?format=ndjson (or Accept:
+    # application/x-ndjson) every row, one object per line, streamed from a
+    # server-side cursor so full exports run in constant memory.
+    if _wants_ndjson():
+        batch = current_app.config['API_STREAM_BATCH']
+
+        def generate():
+            for row in query.order_by(*keys).yield_per(batch):
+                yield _dumps(_select(row, fields)) + '\n'
+        return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+    page = KeysetPage(
+        query, keys, lambda row: tuple(getattr(row, column.key) for column in keys), types,
+        after=request.args.get('after'), before=request.args.get('before'), limit=_limit()
+    )
+    return Response(_dumps({
+        "data": [_select(row, fields) for row in page.rows],
+        "next": page.next_cursor,
+        "prev": page.prev_cursor
+    }), mimetype='application/json')
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+@api_v1.route('/venues')
+def venues():
+    # a full export counts shows with one GROUP BY rather than per-row subqueries
+    query = venue_summaries(correlated=not _wants_ndjson())
+    return _respond(query, (Venue.id,), (int,), _fields(VENUE_FIELDS))
+
+
+@api_v1.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    venue = load_profile(Venue, "detail").filter(Venue.id == venue_id).first_or_404()
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": [genre.name for genre in venue.genres],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link
+    }
+    data.update(venue_shows(venue_id, past_limit=current_app.config['DETAIL_PAST_SHOWS'],
+                            upcoming_limit=current_app.config['DETAIL_UPCOMING_SHOWS']))
+    return Response(_dumps(data), mimetype='application/json')
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+@api_v1.route('/artists')
+def artists():
+    query = artist_summaries(correlated=not _wants_ndjson())
+    return _respond(query, (Artist.id,), (int,), _fields(ARTIST_FIELDS))
+
+
+@api_v1.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    artist = load_profile(Artist, "detail").filter(Artist.id == artist_id).first_or_404()
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": [genre.name for genre in artist.genres],
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link
+    }
+    data.update(artist_shows(artist_id, past_limit=current_app.config['DETAIL_PAST_SHOWS'],
+                             upcoming_limit=current_app.config['DETAIL_UPCOMING_SHOWS']))
+    return Response(_dumps(data), mimetype='application/json')
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+@api_v1.route('/shows')
+def shows():
+    return _respond(show_rows(), (Show.start_time, Show.id), (datetime, int), _fields(SHOW_FIELDS))
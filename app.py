@@ -2,37 +2,181 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import time
+# importing this module and everything it pulls in is timed for the startup report
+IMPORT_STARTED = time.perf_counter()
+
+import functools
+import glob
+import hashlib
 import json
 import logging
 import os
 import sys
+from datetime import datetime, timedelta
 from logging import FileHandler, Formatter
 
-import babel
-import dateutil.parser
-from flask import (Flask, Response, flash, redirect, render_template, request,
-                   url_for)
-from flask_migrate import Migrate
+import click
+import sqlalchemy.orm
+from babel import Locale
+from babel.dates import parse_pattern
+from flask import (Blueprint, Flask, Response, abort, current_app, flash, jsonify, redirect,
+                   render_template, request, stream_template, url_for)
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import Form
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from werkzeug.local import LocalProxy
 
 from forms import *
 from models import *
+from queries import *
+import search
+from suggest import SuggestIndex
+from assets import AssetManifest, asset_url, asset_urls, assets
+from cache import area_tag, cache_tags, cached_page, conditional_page, make_response_cache
+from api import api_v1
+from cli import fyyur_cli
+from compression import init_compression
+from matching import suggested_artists, suggested_venues
+from scheduling import (book_shows, is_booking_conflict, parse_start_times, recurring_start_times,
+                        show_duration)
+from querystats import init_query_stats
+from metrics import Metrics, init_metrics, init_startup_report, metrics_response
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-#app = Flask(__name__)
-#moment = Moment(app)
-#app.config.from_object('config')
-#app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-#db = SQLAlchemy(app)
-
-# TODO: connect to a local postgresql database
+main = Blueprint('main', __name__)
+
+def engine_options(config):
+  # SQLALCHEMY_ENGINE_OPTIONS built from the DATABASE_* settings
+  url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+  if url.get_backend_name() == 'sqlite':
+    return {}
+  options = {
+    'pool_size': config['DATABASE_POOL_SIZE'],
+    'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+    'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+    'pool_recycle': config['DATABASE_POOL_RECYCLE'],
+    'pool_pre_ping': config['DATABASE_POOL_PRE_PING'],
+  }
+  if url.get_backend_name() == 'postgresql' and config['DATABASE_STATEMENT_TIMEOUT']:
+    options['connect_args'] = {'options': f"-c statement_timeout={int(config['DATABASE_STATEMENT_TIMEOUT'])}"}
+  return options
+
+def init_migrations(app):
+  # alembic is only needed by `flask db`, so with DEFER_CLI_IMPORTS it is
+  # imported only when the app is created for a command-line run
+  from flask_migrate import Migrate
+  Migrate(app, db)
+
+def precompile_templates(app):
+  # load, and so compile, every page template now rather than on the first
+  # request to use it; returns how many were loaded
+  names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+  for name in names:
+    app.jinja_env.get_template(name)
+  return len(names)
+
+def release_id(app):
+  # names the deployed code and templates in ETags, so a deploy that changes
+  # how pages render does not leave clients with stale ones: RELEASE when
+  # set (e.g. the commit), else a digest of the sources
+  if app.config['RELEASE']:
+    return str(app.config['RELEASE'])
+  digest = hashlib.sha1()
+  paths = glob.glob(os.path.join(app.root_path, '*.py'))
+  paths += glob.glob(os.path.join(app.root_path, app.template_folder, '**', '*.html'), recursive=True)
+  # pages link the fingerprinted assets it lists
+  paths += glob.glob(os.path.join(app.static_folder, 'dist', 'manifest.json'))
+  for path in sorted(paths):
+    with open(path, 'rb') as source:
+      digest.update(source.read())
+  return digest.hexdigest()[:12]
+
+def create_app(config=None):
+  # the settings are layered as described at the top of config.py
+  started = time.perf_counter()
+  config = dict(config or {})
+  environment = config.get('ENVIRONMENT') or os.environ.get('FYYUR_ENVIRONMENT', 'development')
+  app = Flask(__name__)
+  app.config.from_object('config')
+  if environment not in app.config['ENVIRONMENTS']:
+    raise RuntimeError(f"unknown environment {environment!r}; expected one of {', '.join(app.config['ENVIRONMENTS'])}")
+  app.config.update(app.config['ENVIRONMENTS'][environment])
+  app.config.from_prefixed_env('FYYUR')
+  app.config.update(config)
+  app.config['ENVIRONMENT'] = environment
+  if environment == 'production' and app.config['SECRET_KEY'] == app.config['DEVELOPMENT_SECRET_KEY']:
+    raise RuntimeError("set FYYUR_SECRET_KEY; production cannot use the development secret key")
+  if not app.config.get('SQLALCHEMY_ENGINE_OPTIONS'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+  moment.init_app(app)
+  db.init_app(app)
+  command_line = click.get_current_context(silent=True) is not None
+  if command_line or not app.config['DEFER_CLI_IMPORTS']:
+    init_migrations(app)
+  app.jinja_env.filters['datetime'] = format_datetime
+  app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+  if app.config['TEMPLATE_BYTECODE_CACHE']:
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+  # SQL statistics and metrics. Compression first: after_request hooks run
+  # in reverse, so it sees each response last
+  init_compression(app)
+  init_query_stats(app)
+  app.extensions['metrics'] = Metrics(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+  if app.config['METRICS_ENABLED']:
+    init_metrics(app, db, app.extensions['metrics'])
+
+  # search suggestions, the response cache and the asset manifest, one of each per app
+  app.extensions['suggest_index'] = SuggestIndex(max_age=app.config['SUGGEST_INDEX_MAX_AGE'])
+  app.extensions['response_cache'] = make_response_cache(app.config)
+  app.extensions['assets'] = AssetManifest(app.static_folder, app.config['ASSETS_ENABLED'])
+  app.extensions['release'] = release_id(app)
+
+  app.register_blueprint(main)
+  app.register_blueprint(api_v1)
+  app.register_blueprint(assets)
+  app.cli.add_command(fyyur_cli)
+
+  # a server that imports the app before forking its workers (gunicorn
+  # --preload) would otherwise hand every worker the parent's pooled
+  # connections; each worker opens its own instead
+  os.register_at_fork(after_in_child=functools.partial(dispose_engine, app))
+
+  if not app.debug:
+    file_handler = FileHandler('error.log')
+    file_handler.setFormatter(
+        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    )
+    app.logger.setLevel(logging.INFO)
+    file_handler.setLevel(logging.INFO)
+    app.logger.addHandler(file_handler)
+    app.logger.info('errors')
 
-#migrate = Migrate(app, db)
+  # after init_metrics, so templates are compiled with its timing class.
+  # Babel's locale data and the ORM mappers are also loaded lazily, by the
+  # first date formatted and the first query
+  if app.config['PRECOMPILE_TEMPLATES']:
+    precompile_templates(app)
+    for format in DATETIME_FORMATS:
+      format_datetime(datetime(2000, 1, 1), format)
+    sqlalchemy.orm.configure_mappers()
+  if not command_line:
+    init_startup_report(app, app.extensions['metrics'], IMPORT_SECONDS, time.perf_counter() - started)
+  return app
+
+def dispose_engine(app):
+  with app.app_context():
+    db.engine.dispose(close=False)
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -47,21 +191,49 @@ from models import *
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@functools.lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+  # compiled Babel pattern and parsed Locale, resolved once per (format, locale)
+  return parse_pattern(DATETIME_FORMATS.get(format, format)), Locale.parse(locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # views pass datetime objects; strings are still accepted and parsed
+  if isinstance(value, str):
+    import dateutil.parser
+    value = dateutil.parser.parse(value)
+  pattern, locale = datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
+
+#----------------------------------------------------------------------------#
+# Per-app services.
+#----------------------------------------------------------------------------#
 
-app.jinja_env.filters['datetime'] = format_datetime
+# the current app's instances, created by create_app()
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
+suggest_index = LocalProxy(lambda: current_app.extensions['suggest_index'])
+response_cache = LocalProxy(lambda: current_app.extensions['response_cache'])
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+def search_page():
+  # limit/offset of a search results page, clamped to the configured sizes
+  limit = request.values.get('limit', current_app.config['SEARCH_RESULTS_PER_PAGE'], type=int)
+  offset = request.values.get('offset', 0, type=int)
+  return min(max(limit, 1), current_app.config['SEARCH_MAX_RESULTS_PER_PAGE']), max(offset, 0)
+
+def listing_page_size(setting):
+  # ?limit= for a listing page, defaulting to `setting` and clamped to the configured maximum
+  limit = request.args.get('limit', current_app.config[setting], type=int)
+  return min(max(limit, 1), current_app.config['LISTING_MAX_PER_PAGE'])
+
+@main.route('/')
 def index():
   return render_template('pages/home.html')
 
@@ -69,67 +241,54 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@conditional_page(venue_listing_version)
+@cached_page()
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  results = Venue.query.distinct(Venue.city, Venue.state).all()
-  for result in results:
-        city_state_unit = {
-            "city": result.city,
-            "state": result.state
-        }
-        venues = Venue.query.filter_by(city=result.city, state=result.state).all()
-
-        # format each venue
-        formatted_venues = []
-        for venue in venues:
-            formatted_venues.append({
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": len(list(filter(lambda x: x.start_time > datetime.now(), venue.shows)))
-            })
-        
-        city_state_unit["venues"] = formatted_venues
-        data.append(city_state_unit)
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+  # areas and their upcoming show counts are aggregated by the database, see queries.py
+  # one keyset page at a time, ordered by (state, city, id)
+  genre = request.args.get('genre')
+  criteria = [venues_with_genre(genre)] if genre else []
+  data, page = venue_area_page(*criteria, after=request.args.get('after'), before=request.args.get('before'),
+                               limit=listing_page_size('VENUES_PER_PAGE'))
+  if genre:
+    cache_tags(f'genre:{genre}')
+  cache_tags('venue-areas', *(area_tag(area['city'], area['state']) for area in data))
+  return render_template('pages/venues.html', areas=data, page=page, genre=genre);
+
+@main.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive partial match on name, city and state, ranked by search.py.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  search_term = request.form.get('search_term', '')
-  response = {}
-  venues = list(Venue.query.filter(
-      Venue.name.ilike(f"%{search_term}%") |
-      Venue.state.ilike(f"%{search_term}%") |
-      Venue.city.ilike(f"%{search_term}%") 
-  ).all())
-  response["count"] = len(venues)
-  response["data"] = []
-
-  for venue in venues:
-      venue_unit = {
-          "id": venue.id,
-          "name": venue.name,
-          "num_upcoming_shows": len(list(filter(lambda x: x.start_time > datetime.now(), venue.shows)))
-      }
-      response["data"].append(venue_unit)
-
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/venues/<int:venue_id>')
+  search_term = request.values.get('search_term', '')
+  limit, offset = search_page()
+  response = search.search_venues(search_term, limit=limit, offset=offset)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+@main.route('/search/suggest')
+def search_suggest():
+  # typeahead suggestions for venues and artists, served from the in-memory
+  # n-gram index when enabled and from the database search otherwise.
+  query = request.args.get('q', '')
+  limit = min(max(request.args.get('limit', 10, type=int), 1), current_app.config['SEARCH_MAX_RESULTS_PER_PAGE'])
+  if current_app.config['SUGGEST_INDEX_ENABLED']:
+    return jsonify(suggest_index.suggest(query, limit))
+  return jsonify({
+    "venues": [{"id": venue["id"], "name": venue["name"]} for venue in search.search_venues(query, limit=limit)["data"]],
+    "artists": [{"id": artist["id"], "name": artist["name"]} for artist in search.search_artists(query, limit=limit)["data"]]
+  })
+
+@main.route('/venues/<int:venue_id>')
+@conditional_page(venue_version)
+@cached_page()
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  current_time = datetime.now()
   data = {}
-  venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+  venue = load_profile(Venue, "detail").filter(Venue.id == venue_id).first_or_404()
   data["id"] = venue.id
   data["name"] = venue.name
-  data["genres"] = venue.genres
+  data["genres"] = [genre.name for genre in venue.genres]
   data["address"] = venue.address
   data["city"] = venue.city
   data["state"] = venue.state
@@ -139,42 +298,31 @@ def show_venue(venue_id):
   data["seeking_talent"] = venue.seeking_talent
   data["seeking_description"] = venue.seeking_description
   data["image_link"] = venue.image_link
-  data["upcoming_shows"] = []
-  data["past_shows"] = []
-  
-  upcoming_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id==venue_id).filter(Show.start_time>datetime.now()).all()
-
-  past_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id==venue_id).filter(Show.start_time<datetime.now()).all()
-  
-  for show in past_shows_query:
-      data["past_shows"].append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artists.name,
-      "artist_image_link": show.artists.image_link,
-      "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-    })
-
-  for show in upcoming_shows_query:
-    data["upcoming_shows"].append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artists.name,
-      "artist_image_link": show.artists.image_link,
-      "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S")    
-    })  
-      
-  data["past_shows_count"] = len(data["past_shows"])
-  data["upcoming_shows_count"] = len(data["upcoming_shows"])
+  # past/upcoming windows and their counts, split at one "now"
+  data.update(venue_shows(venue_id, past_limit=current_app.config['DETAIL_PAST_SHOWS'],
+                          upcoming_limit=current_app.config['DETAIL_UPCOMING_SHOWS']))
+  cache_tags(f'venue:{venue_id}', f'venue-shows:{venue_id}',
+             *(f"artist:{show['artist_id']}" for show in data['past_shows'] + data['upcoming_shows']))
   return render_template('pages/show_venue.html', venue=data)
 
+@main.route('/venues/<int:venue_id>/suggested-artists')
+def venue_suggested_artists(venue_id):
+  # artists seeking a venue that suit this one, as of the last
+  # `flask fyyur rebuild-matches`; one indexed lookup
+  venue = suggested_artists(venue_id, current_app.config['MATCHES_PER_OWNER'])
+  if venue is None:
+    abort(404)
+  return render_template('pages/suggestions.html', owner=venue, owner_kind='venue', kind='artist')
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   # TODO: insert form data as a new Venue record in the db, instead
   # TODO: modify data to be the data object returned from db insertion
@@ -190,7 +338,7 @@ def create_venue_submission():
             state=form.state.data,
             address=form.address.data,
             phone=form.phone.data,
-            genres=",".join(form.genres.data), # convert array to string separated by commas
+            genres=genres_named(form.genres.data),
             facebook_link=form.facebook_link.data,
             image_link=form.image_link.data,
             seeking_talent=form.seeking_talent.data,
@@ -199,6 +347,9 @@ def create_venue_submission():
           )
           db.session.add(new_venue)
           db.session.commit()
+          suggest_index.update_venue(new_venue)
+          response_cache.invalidate('venue-areas', area_tag(new_venue.city, new_venue.state),
+                                    *(f'genre:{genre.name}' for genre in new_venue.genres))
           flash('Venue ' + request.form['name'] + ' was successfully listed!')
 
       except Exception:
@@ -214,9 +365,9 @@ def create_venue_submission():
   # TODO: on unsuccessful db insert, flash an error instead.
   # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-  return redirect(url_for("index"))
+  return redirect(url_for(".index"))
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   # TODO: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
@@ -224,9 +375,17 @@ def delete_venue(venue_id):
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
   try:
-      venue = Venue.query.get(venue_id)
+      venue = load_profile(Venue, "delete").get(venue_id)
+      tags = [f'venue:{venue_id}', f'venue-shows:{venue_id}', 'venue-areas', 'shows',
+              area_tag(venue.city, venue.state), *(f'genre:{genre.name}' for genre in venue.genres)]
+      # the pages of the venue's artists lose its shows, and their counts
+      tags.extend({f'artist-shows:{show.artist_id}' for show in venue.shows})
+      touch_venue_artists(venue.id)
+      record_deletion(Venue, venue.id)
       db.session.delete(venue)
       db.session.commit()
+      suggest_index.remove_venue(int(venue_id))
+      response_cache.invalidate(*tags)
       flash("Venue " + venue.name + " was deleted successfully!")
   except:
       db.session.rollback()
@@ -235,54 +394,42 @@ def delete_venue(venue_id):
   finally:
       db.session.close()
 
-  return redirect(url_for("index"))
+  return redirect(url_for(".index"))
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@conditional_page(artist_listing_version)
+@cached_page()
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data=db.session.query(Artist.id, Artist.name).all()
-  return render_template('pages/artists.html', artists=data)
-
-@app.route('/artists/search', methods=['POST'])
+  # one keyset page at a time, ordered by (name, id)
+  genre = request.args.get('genre')
+  criteria = [artists_with_genre(genre)] if genre else []
+  page = artist_page(*criteria, after=request.args.get('after'), before=request.args.get('before'),
+                     limit=listing_page_size('ARTISTS_PER_PAGE'))
+  cache_tags('artists')
+  return render_template('pages/artists.html', artists=page.rows, page=page, genre=genre)
+
+@main.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # case-insensitive partial match on name, ranked by search.py.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  search_term = request.form['search_term']
-  artists_matching_search_term = db.session.query(Artist).filter(Artist.name.ilike('%' + search_term + '%')).all()
-  current_time = datetime.now()
-  response = {
-    "count": len(artists_matching_search_term),
-    "data": []
-  }
-  
-  for artist in artists_matching_search_term: 
-    upcoming_shows = []
-    shows = db.session.query(Show).filter(Show.artist_id == artist.id).all()
-    
-    for show in shows: 
-      if show.start_time > current_time: 
-        upcoming_shows.append(show)
-    
-    response["data"].append({
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": len(upcoming_shows)
-    })
-
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/artists/<int:artist_id>')
+  search_term = request.values.get('search_term', '')
+  limit, offset = search_page()
+  response = search.search_artists(search_term, limit=limit, offset=offset)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+@main.route('/artists/<int:artist_id>')
+@conditional_page(artist_version)
+@cached_page()
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
   data = {}
-  artist = db.session.query(Artist).filter(Artist.id == artist_id).first()
+  artist = load_profile(Artist, "detail").filter(Artist.id == artist_id).first_or_404()
   data["id"] = artist.id
   data["name"] = artist.name
-  data["genres"] = artist.genres
+  data["genres"] = [genre.name for genre in artist.genres]
   data["city"] = artist.city
   data["state"] = artist.state
   data["phone"] = artist.phone
@@ -291,44 +438,33 @@ def show_artist(artist_id):
   data["seeking_venue"] = artist.seeking_venue
   data["seeking_description"] = artist.seeking_description
   data["image_link"] = artist.image_link
-  data["past_shows"] = []
-  data["upcoming_shows"] = []
-  
-  past_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id==artist_id).filter(Show.start_time>datetime.now()).all()
-
-  upcoming_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id==artist_id).filter(Show.start_time>datetime.now()).all()
-  
-  for show in past_shows_query:
-      data["past_shows"].append({
-      "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "artist_image_link": show.venue.image_link,
-      "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-    })
-
-  for show in upcoming_shows_query:
-    data["upcoming_shows"].append({
-      "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "artist_image_link": show.venue.image_link,
-      "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-    })
-
-  data["past_shows_count"] = len(data["past_shows"])
-  data["upcoming_shows_count"] = len(data["upcoming_shows"])
+  # past/upcoming windows and their counts, split at one "now"
+  data.update(artist_shows(artist_id, past_limit=current_app.config['DETAIL_PAST_SHOWS'],
+                           upcoming_limit=current_app.config['DETAIL_UPCOMING_SHOWS']))
+  cache_tags(f'artist:{artist_id}', f'artist-shows:{artist_id}',
+             *(f"venue:{show['venue_id']}" for show in data['past_shows'] + data['upcoming_shows']))
   return render_template('pages/show_artist.html', artist=data)
 
+@main.route('/artists/<int:artist_id>/suggested-venues')
+def artist_suggested_venues(artist_id):
+  # venues seeking talent that suit this artist, as of the last
+  # `flask fyyur rebuild-matches`; one indexed lookup
+  artist = suggested_venues(artist_id, current_app.config['MATCHES_PER_OWNER'])
+  if artist is None:
+    abort(404)
+  return render_template('pages/suggestions.html', owner=artist, owner_kind='artist', kind='venue')
+
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
   form = ArtistForm(request.form)
   
-  artist = db.session.query(Artist).filter(Artist.id == artist_id).first()
+  artist = load_profile(Artist, "edit").filter(Artist.id == artist_id).first()
   
   form.name.data = artist.name
-  form.genres.data = artist.genres
+  form.genres.data = [genre.name for genre in artist.genres]
   form.city.data = artist.city
   form.state.data = artist.state
   form.phone.data = artist.phone
@@ -340,28 +476,31 @@ def edit_artist(artist_id):
   # TODO: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   # TODO: take values from the form submitted, and update existing
   # artist record with ID <artist_id> using the new attributes
 
   error = False
     
-  artist = db.session.query(Artist).filter(Artist.id == artist_id).first()
+  artist = load_profile(Artist, "edit").filter(Artist.id == artist_id).first()
   artist.name = request.form['name']
   artist.city = request.form['city']
   artist.state = request.form['state']
   artist.phone = request.form['phone']
   artist.image_link = request.form['image_link']
-  artist.genres = request.form.getlist('genres')
+  artist.genres = genres_named(request.form.getlist('genres'))
   artist.facebook_link = request.form['facebook_link']
   artist.website = request.form['website_link']
   artist.seeking_venue = True if 'seeking_venue' in request.form else False
   artist.seeking_description = request.form['seeking_description']
-  
+  # set even when only the genres changed, which leaves the row alone
+  artist.updated_at = datetime.utcnow()
   
   try: 
       db.session.commit()
+      suggest_index.update_artist(artist)
+      response_cache.invalidate(f'artist:{artist_id}', 'artists')
   except: 
       db.session.rollback()
       error = True
@@ -373,21 +512,21 @@ def edit_artist_submission(artist_id):
   else: 
       flash('Artist ' + request.form['name'] + ' details updated successfully.')
 
-  return redirect(url_for('show_artist', artist_id=artist_id))
+  return redirect(url_for('.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   form = VenueForm()
   form = VenueForm(request.form)
   
-  venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+  venue = load_profile(Venue, "edit").filter(Venue.id == venue_id).first()
   form.name.data = venue.name
   form.city.data = venue.city
   form.state.data = venue.state
   form.address.data = venue.address
   form.phone.data = venue.phone
   form.image_link.data = venue.image_link
-  form.genres.data = venue.genres
+  form.genres.data = [genre.name for genre in venue.genres]
   form.facebook_link.data = venue.facebook_link
   form.website_link.data = venue.website
   form.seeking_talent.data = venue.seeking_talent
@@ -395,27 +534,37 @@ def edit_venue(venue_id):
   # TODO: populate form with values from venue with ID <venue_id>
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
   error = False
   
-  venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+  venue = load_profile(Venue, "edit").filter(Venue.id == venue_id).first()
+  old_area = area_tag(venue.city, venue.state)
+  genre_tags = {f'genre:{genre.name}' for genre in venue.genres}
   venue.name = request.form['name']
   venue.city = request.form['city']
   venue.state = request.form['state']
   venue.address = request.form['address']
   venue.phone = request.form['phone']
   venue.image_link = request.form['image_link']
-  venue.genres = request.form.getlist('genres')
+  venue.genres = genres_named(request.form.getlist('genres'))
+  genre_tags.update(f'genre:{genre.name}' for genre in venue.genres)
   venue.facebook_link = request.form['facebook_link']
   venue.website = request.form['website_link']
   venue.seeking_talent = True if 'seeking_talent' in request.form else False
   venue.seeking_description = request.form['seeking_description']
-  
+  # set even when only the genres changed, which leaves the row alone
+  venue.updated_at = datetime.utcnow()
   try:
     db.session.commit()
+    suggest_index.update_venue(venue)
+    new_area = area_tag(venue.city, venue.state)
+    if new_area == old_area:
+      response_cache.invalidate(f'venue:{venue_id}', old_area, *genre_tags)
+    else:
+      response_cache.invalidate(f'venue:{venue_id}', old_area, new_area, 'venue-areas', *genre_tags)
   except:
     db.session.rollback()
     error = True
@@ -426,17 +575,17 @@ def edit_venue_submission(venue_id):
     flash('Opps! Venue ' + request.form['name'] + ' details not updated successfully.')
   else: 
     flash('Venue ' + request.form['name'] + ' details updated successfully.')
-  return redirect(url_for('show_venue', venue_id=venue_id))
+  return redirect(url_for('.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # called upon submitting the new artist listing form
   # TODO: insert form data as a new Venue record in the db, instead
@@ -449,7 +598,7 @@ def create_artist_submission():
     city = request.form['city']
     state = request.form['state']
     phone = request.form['phone']
-    genres = request.form('genres')
+    genres = genres_named(request.form.getlist('genres'))
     facebook_link = request.form['facebook_link']
     image_link = request.form['image_link']
     website_link = request.form['website_link']
@@ -460,6 +609,8 @@ def create_artist_submission():
     
     db.session.add(artist)
     db.session.commit()
+    suggest_index.update_artist(artist)
+    response_cache.invalidate('artists')
   except: 
     db.session.rollback()
     error = True
@@ -480,80 +631,157 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@conditional_page(show_listing_version)
+@cached_page()
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  data = []
-  shows = db.session.query(Show).all()
-  for show in shows: 
-    artist = db.session.query(Artist).filter(Artist.id == show.artist_id).first()
-    venue = db.session.query(Venue).filter(Venue.id == show.venue_id).first()
-    data.append({
-      "venue_id": show.venue_id,
-      "venue_name": venue.name, # or venue
-      "artist_id": show.artist_id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-    })
-
-  return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
+  # displays list of shows at /shows, one keyset page at a time.
+  # rows are streamed straight from the joined query into the template.
+  limit = min(request.args.get('limit', current_app.config['SHOWS_PER_PAGE'], type=int), current_app.config['SHOWS_MAX_PER_PAGE'])
+  feed = ShowFeed(after=request.args.get('after'), limit=max(limit, 1))
+  cache_tags('shows')
+  return Response(stream_template('pages/shows.html', shows=feed))
+
+@main.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   # TODO: insert form data as a new Show record in the db, instead
 
-  error = False
+  # only this view parses free-form times, so workers skip the import at boot
+  import dateutil.parser
+
+  error = None
   try: 
-    artist_id = request.form['artist_id']
-    venue_id = request.form['venue_id']
-    start_time = request.form['start_time']
-    
-    show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
-    db.session.add(show)
-    db.session.commit()
+    artist_id = int(request.form['artist_id'])
+    venue_id = int(request.form['venue_id'])
+    start_time = dateutil.parser.parse(request.form['start_time'])
+    end_time = start_time + show_duration(request.form.get('duration'))
+
+    venue = booking_venue(venue_id, artist_id)
+    if venue is None or not venue.artist_found:
+      error = f"Show could not be listed: {'no such venue' if venue is None else 'no such artist'}."
+    else:
+      conflicts = book_shows([{'artist_id': artist_id, 'venue_id': venue_id,
+                               'start_time': start_time, 'end_time': end_time}])
+      if conflicts:
+        db.session.rollback()
+        error = f'Show could not be listed: {conflicts[0]}.'
+      else:
+        db.session.commit()
+        response_cache.invalidate('shows', f'venue-shows:{venue_id}', f'artist-shows:{artist_id}',
+                                  area_tag(venue.city, venue.state))
+  except IntegrityError as exc:
+    db.session.rollback()
+    # booked by another request since the check
+    error = ('Show could not be listed: the venue or the artist is already booked at that time.'
+             if is_booking_conflict(exc) else 'An error occurred. Show could not be listed.')
+    print(sys.exc_info())
   except: 
     db.session.rollback()
-    error = True
+    error = 'An error occurred. Show could not be listed.'
     print(sys.exc_info())
   finally: 
     db.session.close()
   if error: 
      # TODO: on unsuccessful db insert, flash an error instead.
     # e.g., flash('An error occurred. Show could not be listed.')
-    flash('An error occurred. Show could not be listed.')
+    flash(error)
   else: 
     # on successful db insert, flash success
     flash('Show was successfully listed!')
 
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+@main.route('/shows/create/batch', methods=['GET'])
+def create_show_batch():
+  form = ShowBatchForm()
+  return render_template('forms/new_show_batch.html', form=form, problems=[])
+
+@main.route('/shows/create/batch', methods=['POST'])
+def create_show_batch_submission():
+  # Many shows of one artist at one venue, from a list of start times and/or
+  # a recurrence rule. Every show is validated and checked for conflicts
+  # before any is written; then all are inserted with one multi-row INSERT
+  # and committed together, or the form comes back listing what is wrong.
+  form = ShowBatchForm(request.form)
+  limit = current_app.config['SHOW_BATCH_MAX']
+  problems = []
+  start_times = []
+  if form.validate():
+    try:
+      start_times = parse_start_times(form.start_times.data or '')
+      if form.recurrence.data:
+        start_times += recurring_start_times(form.recurrence.data, form.first_start_time.data, limit)
+    except ValueError as error:
+      problems.append(str(error))
+    if not problems and not start_times:
+      problems.append('give start times, or a first start time and a recurrence')
+    if len(start_times) > limit:
+      problems.append(f'a batch lists at most {limit} shows, not {len(start_times)}')
+  else:
+    problems.extend(f"{field}: {', '.join(errors)}" for field, errors in form.errors.items())
+
+  if not problems:
+    artist_id, venue_id = form.artist_id.data, form.venue_id.data
+    duration = timedelta(minutes=form.duration.data)
+    shows = [{'artist_id': artist_id, 'venue_id': venue_id, 'start_time': start_time,
+              'end_time': start_time + duration} for start_time in start_times]
+    try:
+      venue = booking_venue(venue_id, artist_id)
+      if venue is None or not venue.artist_found:
+        problems.append('no such venue' if venue is None else 'no such artist')
+      else:
+        conflicts = book_shows(shows)
+        if conflicts:
+          db.session.rollback()
+          problems.extend(f"{shows[index]['start_time']:%Y-%m-%d %H:%M}: {message}"
+                          for index, message in sorted(conflicts.items()))
+        else:
+          db.session.commit()
+          response_cache.invalidate('shows', f'venue-shows:{venue_id}', f'artist-shows:{artist_id}',
+                                    area_tag(venue.city, venue.state))
+    except IntegrityError as exc:
+      db.session.rollback()
+      problems.append('the venue or the artist was booked at one of these times meanwhile'
+                      if is_booking_conflict(exc) else 'an error occurred')
+      print(sys.exc_info())
+    except Exception:
+      db.session.rollback()
+      problems.append('an error occurred')
+      print(sys.exc_info())
+    finally:
+      db.session.close()
+
+  if problems:
+    flash('Shows could not be listed.')
+    return render_template('forms/new_show_batch.html', form=form, problems=problems)
+  flash(f'{len(shows)} shows were successfully listed!')
+  return redirect(url_for('.index'))
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@main.route('/metrics')
+def metrics_endpoint():
+  if not current_app.config['METRICS_ENABLED']:
+    abort(404)
+  return metrics_response(metrics)
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -561,11 +789,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,262 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    # the .br copies are skipped; gzip is always available
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Bundles.
+#----------------------------------------------------------------------------#
+
+# Files under static/ served as one file each, in this order. Without a
+# build, asset_urls() lists the sources instead.
+BUNDLES = {
+    'css/site.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # run before the page is parsed
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred, after jQuery
+    'js/site.js': [
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+        'js/script.js',
+    ],
+}
+
+OUTPUT_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# precompressed copies are made of these and kept when smaller
+COMPRESSIBLE = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.eot', '.ttf', '.otf', '.ico'}
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s*([{};,>])\s*')
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def minify_css(text):
+    # comments and the whitespace around punctuation; strings in CSS rarely
+    # hold either. Space before a colon can be a descendant selector
+    # (`a :hover`), so only the space after one goes.
+    text = CSS_COMMENT.sub('', text)
+    text = CSS_SPACE.sub(r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return re.sub(r'\s+', ' ', text).replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # only what cannot change meaning: indentation, blank lines and lines
+    # that are a // comment. Line breaks stay, so automatic semicolon
+    # insertion sees the same program.
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def minify(name, text):
+    if '.min.' in name:
+        return text
+    if name.endswith('.css'):
+        return minify_css(text)
+    if name.endswith('.js'):
+        return minify_js(text)
+    return text
+
+
+def hashed_name(name, data):
+    root, extension = posixpath.splitext(name)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+
+
+def rewrite_css_urls(name, text, manifest, output=None):
+    # url(...) in a stylesheet is relative to it. Point each, from where the
+    # stylesheet is written (`output`, by default its own name), at the built
+    # copy, or back at the source under /static when there is none; the
+    # output keeps the layout of static/, one level down.
+    directory = posixpath.dirname(name)
+    base = posixpath.dirname(output or name) or '.'
+
+    def replace(match):
+        url = match.group(2).strip()
+        if url.startswith(('data:', '/', '#')) or '://' in url:
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(posixpath.join(directory, path))
+        entry = manifest.get(target)
+        if entry is not None:
+            url = posixpath.relpath(entry['path'], base)
+        else:
+            url = posixpath.relpath(posixpath.join('..', target), base)
+        return f'url("{url}{suffix}")'
+    return CSS_URL.sub(replace, text)
+
+
+def write_asset(output_dir, name, data):
+    # the file and its precompressed copies; returns the manifest entry
+    path = hashed_name(name, data)
+    destination = os.path.join(output_dir, *path.split('/'))
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with open(destination, 'wb') as output:
+        output.write(data)
+    entry = {'path': path, 'size': len(data), 'encodings': {}}
+    if posixpath.splitext(name)[1] not in COMPRESSIBLE:
+        return entry
+    compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed['br'] = brotli.compress(data, quality=11)
+    for encoding, body in compressed.items():
+        if len(body) < len(data):
+            with open(destination + ENCODINGS[encoding], 'wb') as output:
+                output.write(body)
+            entry['encodings'][encoding] = len(body)
+    return entry
+
+
+def static_files(static_folder):
+    # relative, '/'-separated names of the sources, without the build output
+    for directory, subdirectories, files in os.walk(static_folder):
+        relative = os.path.relpath(directory, static_folder).replace(os.sep, '/')
+        if relative == OUTPUT_DIR:
+            subdirectories[:] = []
+            continue
+        for filename in files:
+            if not filename.startswith('.'):
+                yield filename if relative == '.' else f'{relative}/{filename}'
+
+
+def build_assets(static_folder, bundles=BUNDLES):
+    # fingerprint everything under static_folder, and every bundle, into
+    # static_folder/dist and write its manifest there. Stylesheets go last,
+    # so their url(...)s can point at the fingerprinted fonts and images.
+    # Returns the manifest: source name -> path under dist, size in bytes
+    # and the size of each precompressed copy.
+    output_dir = os.path.join(static_folder, OUTPUT_DIR)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+
+    def read(name):
+        with open(os.path.join(static_folder, *name.split('/')), 'rb') as source:
+            return source.read()
+
+    def text(name):
+        return minify(name, read(name).decode('utf-8'))
+
+    manifest = {}
+    names = sorted(static_files(static_folder), key=lambda name: (name.endswith('.css'), name))
+    for name in names:
+        if name.endswith('.css'):
+            data = rewrite_css_urls(name, text(name), manifest).encode('utf-8')
+        elif name.endswith('.js'):
+            data = text(name).encode('utf-8')
+        else:
+            data = read(name)
+        manifest[name] = write_asset(output_dir, name, data)
+    for bundle, sources in bundles.items():
+        parts = []
+        for source in sources:
+            part = text(source)
+            if bundle.endswith('.css'):
+                part = rewrite_css_urls(source, part, manifest, output=bundle)
+            parts.append(part)
+        separator = '\n' if bundle.endswith('.css') else ';\n'
+        manifest[bundle] = write_asset(output_dir, bundle, separator.join(parts).encode('utf-8'))
+
+    with open(os.path.join(output_dir, MANIFEST), 'w') as output:
+        json.dump(manifest, output, indent=2, sort_keys=True)
+        output.write('\n')
+    return manifest
+
+#----------------------------------------------------------------------------#
+# Manifest.
+#----------------------------------------------------------------------------#
+
+class AssetManifest:
+    # the manifest build_assets() wrote, read once per app; empty when there
+    # has been no build
+
+    def __init__(self, static_folder, enabled=True):
+        self.output_dir = os.path.join(static_folder, OUTPUT_DIR)
+        self.files = {}
+        path = os.path.join(self.output_dir, MANIFEST)
+        if enabled and os.path.isfile(path):
+            with open(path) as manifest:
+                self.files = json.load(manifest)
+        self.served = {entry['path']: entry for entry in self.files.values()}
+
+
+def asset_url(name):
+    # URL of a file under static/: its fingerprinted copy once built
+    entry = current_app.extensions['assets'].files.get(name)
+    if entry is None:
+        return url_for('static', filename=name)
+    return url_for('assets.asset', filename=entry['path'])
+
+
+def asset_urls(name):
+    # URLs to load for a bundle (or a single file): the built bundle, or
+    # each of its sources when there has been no build
+    if name in current_app.extensions['assets'].files or name not in BUNDLES:
+        return [asset_url(name)]
+    return [asset_url(source) for source in BUNDLES[name]]
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+assets = Blueprint('assets', __name__)
+
+
+def choose_encoding(accept_encodings, available):
+    # the smallest precompressed copy the client accepts, or None
+    for encoding in sorted(available, key=available.get):
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+@assets.route(f'/static/{OUTPUT_DIR}/<path:filename>')
+def asset(filename):
+    # fingerprinted files never change, so clients keep them for
+    # ASSETS_MAX_AGE without revalidating
+    entry = current_app.extensions['assets'].served.get(filename)
+    if entry is None:
+        abort(404)
+    encoding = choose_encoding(request.accept_encodings, entry['encodings'])
+    response = send_from_directory(
+        current_app.extensions['assets'].output_dir, filename + ENCODINGS.get(encoding, ''),
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        max_age=current_app.config['ASSETS_MAX_AGE']
+    )
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,57 @@
+"""Per-row cost of the `datetime` template filter.
+
+    python benchmarks/bench_datetime_filter.py [--rows N]
+
+Compares the original filter, which re-parsed a strftime string with
+dateutil and let Babel resolve the pattern on every call, with
+app.format_datetime on datetime objects.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def original_format_datetime(value, format='medium'):
+    import babel.dates
+    import dateutil.parser
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def per_row(function, values, format):
+    start = time.perf_counter()
+    for value in values:
+        function(value, format)
+    return (time.perf_counter() - start) / len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    from app import format_datetime
+
+    start = datetime(2026, 1, 1, 20, 0)
+    values = [start + timedelta(hours=17 * n) for n in range(args.rows)]
+    strings = [value.strftime('%Y-%m-%d %H:%M:%S') for value in values]
+
+    print(f"{'format':<8}{'original (us/row)':>20}{'current (us/row)':>20}{'speedup':>10}")
+    for format in ('full', 'medium'):
+        assert all(original_format_datetime(string, format) == format_datetime(value, format)
+                   for string, value in zip(strings[:500], values[:500]))
+        original = per_row(original_format_datetime, strings, format)
+        current = per_row(format_datetime, values, format)
+        print(f"{format:<8}{original * 1e6:>20.2f}{current * 1e6:>20.2f}{original / current:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""Time every route in app.py through the test client and compare with a baseline.
+
+    python benchmarks/bench_routes.py [--scale 10k|100k|1m] [--requests N] [--database-url URL]
+                                      [--cache] [--accept-encoding CODINGS]
+                                      [--save-baseline FILE] [--baseline FILE] [--threshold PCT]
+                                      [--strict]
+
+Seeds the database with generate_data.py when it is empty, then sends
+--requests requests to each scenario below (ids drawn from a fixed seed) and
+reports p50/p99 latency, SQL statements per request, the peak Python
+memory one request allocates (tracemalloc) and the bytes its response takes
+on the wire against its decoded size. Requests send --accept-encoding
+('gzip, br' by default, '' for none) unless a scenario sets its own headers.
+Write scenarios run after the
+reads; the venues they create are deleted by the last one and the artists
+removed at the end, so a stored database can be reused. The response cache
+is off unless --cache is given. The "304" scenarios revalidate a page with
+the ETag of an earlier response.
+
+Routes are held to their QUERY_BUDGETS entries: one that sends more
+statements fails with a 500 and the run exits with status 1.
+
+--save-baseline stores the results as JSON; --baseline compares against such
+a file and exits with status 1 when a route sends more statements than
+before or answers with other status codes. Timings and memory depend on the
+machine and the Python build, so growth above --threshold percent is only
+reported, unless --strict is given on the machine that saved the baseline.
+"""
+import argparse
+import gc
+import gzip
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_data import SCALES, counts, generate, is_empty
+
+# latency changes smaller than this are noise, whatever the percentage
+MIN_LATENCY_DELTA_MS = 0.5
+
+
+class Context:
+    # deterministic ids for each request, plus rows the write scenarios made
+
+    def __init__(self, db, seed):
+        from models import Venue, Artist
+        rng = random.Random(seed)
+        venues = db.session.query(Venue.id).order_by(Venue.id).all()
+        artists = db.session.query(Artist.id).order_by(Artist.id).all()
+        self.venue_ids = [row.id for row in rng.sample(venues, min(len(venues), 100))]
+        self.artist_ids = [row.id for row in rng.sample(artists, min(len(artists), 100))]
+        self.created_venues = []
+        self.created_artists = []
+        self.client = None
+        self.etags = {}
+
+    def venue(self, n):
+        return self.venue_ids[n % len(self.venue_ids)]
+
+    def artist(self, n):
+        return self.artist_ids[n % len(self.artist_ids)]
+
+    def etag(self, path):
+        # fetched once, by the warm-up request of the scenario using it
+        if path not in self.etags:
+            self.etags[path] = self.client.get(path).headers['ETag']
+        return self.etags[path]
+
+
+def built(name):
+    # URL of a file under static/, fingerprinted when `flask fyyur build-assets` has run
+    from flask import current_app
+    entry = current_app.extensions['assets'].files.get(name)
+    return f"/static/dist/{entry['path']}" if entry else f'/static/{name}'
+
+
+def revalidate(path):
+    # headers(ctx, n) of a conditional GET for the page at path(ctx, n)
+    return lambda ctx, n: {'If-None-Match': ctx.etag(path(ctx, n))}
+
+
+def venue_form(n, name='Bench Venue'):
+    return {'name': f'{name} {n}', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+            'phone': '4155550100', 'genres': ['Jazz', 'Blues'], 'facebook_link': 'https://www.facebook.com/bench',
+            'image_link': '', 'website_link': '', 'seeking_description': ''}
+
+
+def artist_form(n, name='Bench Artist'):
+    return {'name': f'{name} {n}', 'city': 'Austin', 'state': 'TX', 'phone': '5125550100',
+            'genres': ['Rock n Roll'], 'facebook_link': 'https://www.facebook.com/bench',
+            'image_link': '', 'website_link': '', 'seeking_description': ''}
+
+
+# (name, endpoint, method, path(ctx, n), form data(ctx, n) or None[, headers(ctx, n)])
+READS = [
+    ('home', 'main.index', 'GET', lambda ctx, n: '/', None),
+    ('static', 'static', 'GET', lambda ctx, n: '/static/css/main.css', None),
+    ('asset', 'assets.asset', 'GET', lambda ctx, n: built('css/bootstrap.min.css'), None,
+     lambda ctx, n: {'Accept-Encoding': 'gzip, br'}),
+    ('venues', 'main.venues', 'GET', lambda ctx, n: '/venues', None),
+    ('venues?genre', 'main.venues', 'GET', lambda ctx, n: '/venues?genre=Jazz', None),
+    ('venue', 'main.show_venue', 'GET', lambda ctx, n: f'/venues/{ctx.venue(n)}', None),
+    ('venue matches', 'main.venue_suggested_artists', 'GET',
+     lambda ctx, n: f'/venues/{ctx.venue(n)}/suggested-artists', None),
+    ('venues 304', 'main.venues', 'GET', lambda ctx, n: '/venues', None, revalidate(lambda ctx, n: '/venues')),
+    ('venue 304', 'main.show_venue', 'GET', lambda ctx, n: f'/venues/{ctx.venue(0)}', None,
+     revalidate(lambda ctx, n: f'/venues/{ctx.venue(0)}')),
+    ('venue search', 'main.search_venues', 'POST', lambda ctx, n: '/venues/search', lambda ctx, n: {'search_term': 'club'}),
+    ('venue search GET', 'main.search_venues', 'GET', lambda ctx, n: '/venues/search?search_term=san', None),
+    ('suggest', 'main.search_suggest', 'GET', lambda ctx, n: '/search/suggest?q=blu', None),
+    ('venue create form', 'main.create_venue_form', 'GET', lambda ctx, n: '/venues/create', None),
+    ('venue edit form', 'main.edit_venue', 'GET', lambda ctx, n: f'/venues/{ctx.venue(n)}/edit', None),
+    ('artists', 'main.artists', 'GET', lambda ctx, n: '/artists', None),
+    ('artist', 'main.show_artist', 'GET', lambda ctx, n: f'/artists/{ctx.artist(n)}', None),
+    ('artist matches', 'main.artist_suggested_venues', 'GET',
+     lambda ctx, n: f'/artists/{ctx.artist(n)}/suggested-venues', None),
+    ('artist search', 'main.search_artists', 'POST', lambda ctx, n: '/artists/search', lambda ctx, n: {'search_term': 'rock'}),
+    ('artist create form', 'main.create_artist_form', 'GET', lambda ctx, n: '/artists/create', None),
+    ('artist edit form', 'main.edit_artist', 'GET', lambda ctx, n: f'/artists/{ctx.artist(n)}/edit', None),
+    ('shows', 'main.shows', 'GET', lambda ctx, n: '/shows', None),
+    ('shows 304', 'main.shows', 'GET', lambda ctx, n: '/shows', None, revalidate(lambda ctx, n: '/shows')),
+    ('show create form', 'main.create_shows', 'GET', lambda ctx, n: '/shows/create', None),
+    ('show batch form', 'main.create_show_batch', 'GET', lambda ctx, n: '/shows/create/batch', None),
+    ('api venues', 'api_v1.venues', 'GET', lambda ctx, n: '/api/v1/venues', None),
+    ('api venue', 'api_v1.venue', 'GET', lambda ctx, n: f'/api/v1/venues/{ctx.venue(n)}', None),
+    ('api artists', 'api_v1.artists', 'GET', lambda ctx, n: '/api/v1/artists', None),
+    ('api artist', 'api_v1.artist', 'GET', lambda ctx, n: f'/api/v1/artists/{ctx.artist(n)}', None),
+    ('api shows', 'api_v1.shows', 'GET', lambda ctx, n: '/api/v1/shows', None),
+    ('metrics', 'main.metrics_endpoint', 'GET', lambda ctx, n: '/metrics', None),
+]
+
+WRITES = [
+    ('venue create', 'main.create_venue_submission', 'POST', lambda ctx, n: '/venues/create', lambda ctx, n: venue_form(n)),
+    ('venue edit', 'main.edit_venue_submission', 'POST',
+     lambda ctx, n: f'/venues/{ctx.created_venues[n % len(ctx.created_venues)]}/edit',
+     lambda ctx, n: venue_form(n, 'Edited Venue')),
+    ('artist create', 'main.create_artist_submission', 'POST', lambda ctx, n: '/artists/create', lambda ctx, n: artist_form(n)),
+    ('artist edit', 'main.edit_artist_submission', 'POST',
+     lambda ctx, n: f'/artists/{ctx.created_artists[n % len(ctx.created_artists)]}/edit',
+     lambda ctx, n: artist_form(n, 'Edited Artist')),
+    ('show create', 'main.create_show_submission', 'POST', lambda ctx, n: '/shows/create',
+     lambda ctx, n: {'artist_id': ctx.created_artists[n % len(ctx.created_artists)],
+                     'venue_id': ctx.created_venues[n % len(ctx.created_venues)],
+                     'start_time': f'{date(2025, 6, 1) + timedelta(days=n)} 20:00:00'}),
+    ('show batch', 'main.create_show_batch_submission', 'POST', lambda ctx, n: '/shows/create/batch',
+     lambda ctx, n: {'artist_id': ctx.created_artists[n % len(ctx.created_artists)],
+                     'venue_id': ctx.created_venues[n % len(ctx.created_venues)],
+                     'first_start_time': f'{date(2030, 1, 4) + timedelta(weeks=10 * n)} 20:00',
+                     'recurrence': 'FREQ=WEEKLY;COUNT=8'}),
+    ('venue delete', 'main.delete_venue', 'DELETE', lambda ctx, n: f'/venues/{ctx.created_venues[n]}', None),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def decoded_size(response, body):
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        return len(gzip.decompress(body))
+    if encoding == 'br':
+        import brotli
+        return len(brotli.decompress(body))
+    return len(body)
+
+
+def run(client, ctx, scenario, requests, statements, accept_encoding=None):
+    name, endpoint, method, path, data, headers = (*scenario, None)[:6]
+    latencies, queries, statuses = [], [], set()
+
+    def request_headers(n):
+        merged = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+        merged.update(headers(ctx, n) if headers else {})
+        return merged
+
+    gc.collect()
+    for n in range(requests + 1):
+        statements[0] = 0
+        start = time.perf_counter()
+        response = client.open(path(ctx, n), method=method, data=data(ctx, n) if data else None,
+                               headers=request_headers(n))
+        response.get_data()
+        response.close()
+        elapsed = time.perf_counter() - start
+        statuses.add(response.status_code)
+        if n:
+            # the first request warms up caches and indexes
+            latencies.append(elapsed * 1000)
+            queries.append(statements[0])
+
+    n = requests + 1
+    tracemalloc.start()
+    response = client.open(path(ctx, n), method=method, data=data(ctx, n) if data else None,
+                           headers=request_headers(n))
+    body = response.get_data()
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    statuses.add(response.status_code)
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': max(queries),
+        'peak_kib': round(peak / 1024, 1),
+        'wire_bytes': len(body),
+        'body_bytes': decoded_size(response, body),
+        'status': sorted(statuses)
+    }
+
+
+def saved(wire, body):
+    return f'{(body - wire) / body * 100:.0f}%' if body else '-'
+
+
+def compare(results, baseline, threshold, strict=False):
+    # printable lines and whether anything regressed. More statements or
+    # other status codes always fail; p50 and memory growth fail only when
+    # `strict`. p99 over a few dozen requests is mostly GC and scheduler
+    # noise, so it is shown but never fails the comparison.
+    lines, regressed = [], False
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            lines.append(f"{name:20} new")
+            continue
+        notes, failed = [], False
+        if result['queries'] > before['queries']:
+            notes.append(f"queries {before['queries']} -> {result['queries']}")
+            failed = True
+        if result['status'] != before['status']:
+            notes.append(f"status {before['status']} -> {result['status']}")
+            failed = True
+        for key in ('p50_ms', 'p99_ms', 'peak_kib'):
+            old, new = before[key], result[key]
+            change = (new - old) / old * 100 if old else 0.0
+            noise = key != 'peak_kib' and abs(new - old) < MIN_LATENCY_DELTA_MS
+            if change > threshold and not noise:
+                notes.append(f"{key} {old} -> {new} (+{change:.0f}%)")
+                failed = failed or (strict and key != 'p99_ms')
+        regressed = regressed or failed
+        lines.append(f"{name:20} {'REGRESSED' if failed else 'ok':9} {'; '.join(notes)}".rstrip())
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--cache', action='store_true', help='leave the response cache on')
+    parser.add_argument('--accept-encoding', default='gzip, br', metavar='CODINGS')
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--baseline', metavar='FILE')
+    parser.add_argument('--threshold', type=float, default=50.0)
+    parser.add_argument('--strict', action='store_true',
+                        help='also fail on p50 latency and memory growth')
+    args = parser.parse_args()
+
+    from sqlalchemy import event, func
+    from app import create_app
+    from matching import rebuild_matches
+    from models import db, Venue, Artist, Match
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database_url,
+        'WTF_CSRF_ENABLED': False,
+        'RESPONSE_CACHE_ENABLED': args.cache,
+        'QUERY_BUDGET_ENFORCE': True,
+    })
+    app.logger.setLevel(logging.WARNING)
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    with app.app_context():
+        db.create_all()
+        if is_empty(db):
+            print("seeding %d venues, %d artists, %d shows" % counts(SCALES[args.scale]))
+            generate(db, SCALES[args.scale], args.seed)
+        if db.session.query(Match.venue_id).first() is None:
+            rebuild_matches(app.config['MATCHES_PER_OWNER'])
+        ctx = Context(db, args.seed)
+        db.session.remove()
+
+        covered = {scenario[1] for scenario in READS + WRITES}
+        missing = sorted({rule.endpoint for rule in app.url_map.iter_rules()} - covered)
+        if missing:
+            print(f"warning: no scenario for {', '.join(missing)}")
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        client = ctx.client = app.test_client()
+        results = {}
+        print(f"{'route':20} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9} {'wire KiB':>9} "
+              f"{'saved':>6}  status")
+        for scenario in READS + WRITES:
+            name = scenario[0]
+            last_venue = db.session.query(func.max(Venue.id)).scalar()
+            last_artist = db.session.query(func.max(Artist.id)).scalar()
+            db.session.remove()
+            result = results[name] = run(client, ctx, scenario, args.requests, statements, args.accept_encoding)
+            if name == 'venue create':
+                ctx.created_venues = [row.id for row in db.session.query(Venue.id).filter(Venue.id > last_venue)]
+            if name == 'artist create':
+                ctx.created_artists = [row.id for row in db.session.query(Artist.id).filter(Artist.id > last_artist)]
+            db.session.remove()
+            print(f"{name:20} {result['p50_ms']:9.2f} {result['p99_ms']:9.2f} {result['queries']:8d} "
+                  f"{result['peak_kib']:9.1f} {result['wire_bytes'] / 1024:9.1f} "
+                  f"{saved(result['wire_bytes'], result['body_bytes']):>6}  {','.join(map(str, result['status']))}")
+        event.remove(db.engine, 'before_cursor_execute', count)
+        for artist in db.session.query(Artist).filter(Artist.id.in_(ctx.created_artists)):
+            db.session.delete(artist)
+        db.session.commit()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"peak RSS: {peak_rss / 1024:.0f} MiB")
+    wire = sum(result['wire_bytes'] for result in results.values())
+    body = sum(result['body_bytes'] for result in results.values())
+    print(f"bytes on wire: {wire / 1024:.1f} KiB for {body / 1024:.1f} KiB of responses, "
+          f"{saved(wire, body)} saved (Accept-Encoding: {args.accept_encoding or 'none'})")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline:
+            json.dump({
+                'meta': {'scale': args.scale, 'seed': args.seed, 'requests': args.requests,
+                         'database': args.database_url.split(':', 1)[0], 'cache': args.cache,
+                         'accept_encoding': args.accept_encoding,
+                         'python': platform.python_version()},
+                'routes': results
+            }, baseline, indent=2, sort_keys=True)
+            baseline.write('\n')
+
+    failed = sorted(name for name, result in results.items() if max(result['status']) >= 500)
+    if failed:
+        # includes routes over their QUERY_BUDGETS entry
+        print(f"failed: {', '.join(failed)}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            stored = json.load(baseline)
+        if stored['meta']['scale'] != args.scale:
+            print(f"warning: the baseline was recorded at scale {stored['meta']['scale']}")
+        lines, regressed = compare(results, stored['routes'], args.threshold, args.strict)
+        print(f"\ncompared with {args.baseline} ({stored['meta']['scale']}, threshold {args.threshold:.0f}%"
+              f"{'' if args.strict else ', timings and memory advisory'})")
+        print('\n'.join(lines))
+        sys.exit(1 if failed or regressed else 0)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Time a cold start: importing the app, create_app() and the first requests.
+
+    python benchmarks/bench_startup.py [--runs N] [--shows N] [--database-url URL]
+                                       [--path PATH ...]
+
+Each run is a fresh interpreter, started once with the old eager startup
+(alembic imported, templates compiled by the requests that first render
+them, no bytecode cache) and once with the startup settings in config.py
+(DEFER_CLI_IMPORTS, PRECOMPILE_TEMPLATES and a bytecode cache filled by an
+earlier run, as `flask fyyur compile-templates` would at deploy). Reports
+the median import and create_app() times, the latency of the process's
+first request and of the first hit on every --path, and the wall time of
+the whole run. The database, a temporary SQLite file by default, is seeded
+with generate_data.py when empty.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ['/shows', '/venues/1', '/artists/1', '/venues', '/artists', '/venues/create']
+
+# FYYUR_* settings for each mode, see create_app()
+MODES = {
+    'eager': {'DEFER_CLI_IMPORTS': False, 'PRECOMPILE_TEMPLATES': False, 'TEMPLATE_BYTECODE_CACHE': False},
+    'startup': {'DEFER_CLI_IMPORTS': True, 'PRECOMPILE_TEMPLATES': True, 'TEMPLATE_BYTECODE_CACHE': True},
+}
+
+
+def child(database_url, paths):
+    # runs in the measured interpreter; prints one JSON line
+    start = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    created = time.perf_counter()
+    client = app.test_client()
+    first_hits = []
+    for path in paths:
+        request_start = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        response.close()
+        first_hits.append((time.perf_counter() - request_start) * 1000)
+        if response.status_code != 200:
+            sys.exit(f'{path}: HTTP {response.status_code}')
+    print(json.dumps({'import_ms': (imported - start) * 1000, 'create_app_ms': (created - imported) * 1000,
+                      'first_request_ms': first_hits[0], 'first_hits_ms': sum(first_hits)}))
+
+
+def run(mode, database_url, paths, cache_dir):
+    environment = dict(os.environ, FYYUR_TEMPLATE_CACHE_DIR=cache_dir)
+    environment.update((f'FYYUR_{name}', json.dumps(value)) for name, value in MODES[mode].items())
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', '--database-url', database_url, '--path', *paths],
+        env=environment, cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def seed(database_url, shows):
+    from app import create_app
+    from generate_data import generate, is_empty
+    from models import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    with app.app_context():
+        db.create_all()
+        if is_empty(db):
+            generate(db, shows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--path', nargs='+', default=PATHS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.database_url, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as scratch:
+        database_url = args.database_url or f"sqlite:///{os.path.join(scratch, 'fyyur.db')}"
+        seed(database_url, args.shows)
+        cache_dir = os.path.join(scratch, 'jinja')
+        os.mkdir(cache_dir)
+        # fills the bytecode cache, as a deploy would
+        run('startup', database_url, args.path, cache_dir)
+
+        results = {mode: [] for mode in MODES}
+        for _ in range(args.runs):
+            for mode in MODES:
+                results[mode].append(run(mode, database_url, args.path, cache_dir))
+
+    columns = ['import_ms', 'create_app_ms', 'first_request_ms', 'first_hits_ms', 'wall_ms']
+    print(f"{'mode':10}" + ''.join(f'{column[:-3]:>15}' for column in columns) + '   (median ms)')
+    medians = {mode: {column: statistics.median(run[column] for run in runs) for column in columns}
+               for mode, runs in results.items()}
+    for mode, median in medians.items():
+        print(f'{mode:10}' + ''.join(f'{median[column]:15.1f}' for column in columns))
+    print(f"{'change':10}" + ''.join(
+        f"{(medians['startup'][column] - medians['eager'][column]) / medians['eager'][column] * 100:+14.0f}%"
+        for column in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare /search/suggest lookups in the n-gram index with the ILIKE search.
+
+    python benchmarks/bench_suggest.py [--venues N] [--artists N] [--database-url URL]
+
+Seeds a throwaway database (in-memory SQLite by default) with synthetic
+venues and artists, then times the same queries against
+SuggestIndex.suggest and search.search_venues/search_artists.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ['the', 'musical', 'hop', 'park', 'square', 'live', 'music', 'coffee', 'dueling',
+         'pianos', 'bar', 'wild', 'sax', 'band', 'guns', 'petals', 'matt', 'quevado',
+         'blue', 'note', 'room', 'hall', 'club', 'lounge', 'jazz', 'rock', 'soul']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'),
+          ('Chicago', 'IL'), ('Nashville', 'TN'), ('Denver', 'CO'), ('Boston', 'MA')]
+QUERIES = ['hop', 'mus', 'band', 'san', 'ny', 'blue note', 'pia', 'x', 'lounge', 'quev']
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--artists', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', default='sqlite://')
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import db, Venue, Artist
+    import search
+    from suggest import SuggestIndex
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url})
+    random.seed(1)
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_insert_mappings(Venue, [{
+            'name': ' '.join(random.sample(WORDS, 3)).title(),
+            'city': city, 'state': state, 'seeking_talent': False
+        } for city, state in (random.choice(CITIES) for _ in range(args.venues))])
+        db.session.bulk_insert_mappings(Artist, [{
+            'name': ' '.join(random.sample(WORDS, 2)).title(), 'seeking_venue': False
+        } for _ in range(args.artists)])
+        db.session.commit()
+
+        index = SuggestIndex()
+        build = timed(index.rebuild, 1)
+        print(f"index build: {build * 1000:.1f} ms for {args.venues} venues, {args.artists} artists")
+        print(f"{'query':<12}{'index (us)':>12}{'ilike (us)':>12}{'speedup':>10}")
+        for query in QUERIES:
+            in_memory = timed(lambda: index.suggest(query, 10), args.repeat)
+            ilike = timed(lambda: (search.search_venues(query, limit=10),
+                                   search.search_artists(query, limit=10)), args.repeat)
+            print(f"{query:<12}{in_memory * 1e6:>12.1f}{ilike * 1e6:>12.1f}{ilike / in_memory:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Fail when a detail page reads the Show table without an index.
+
+    python benchmarks/check_query_plans.py [--shows N] [--database-url URL]
+
+Seeds a throwaway database (in-memory SQLite by default), requests
+/venues/<id> and /artists/<id> through the test client, and EXPLAINs every
+statement they send that filters Show by venue or artist. Exits with status
+1 and prints the plan if any of them scans Show sequentially.
+
+This is the query plan regression test. The project has no test runner, so
+it is a script by design, and its exit status is the assertion: `fab test`
+runs it before the benchmark and stops a deploy when it fails.
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DETAIL_PAGES = ['/venues/{venue_id}', '/artists/{artist_id}']
+
+
+def seed(db, Venue, Artist, Show, shows):
+    random.seed(1)
+    venues, artists = max(shows // 100, 1), max(shows // 50, 1)
+    db.session.bulk_insert_mappings(Venue, [
+        {'name': f'Venue {n}', 'city': f'City {n % 50}', 'state': 'CA', 'seeking_talent': False}
+        for n in range(venues)])
+    db.session.bulk_insert_mappings(Artist, [
+        {'name': f'Artist {n}', 'seeking_venue': False} for n in range(artists)])
+    now = datetime.now()
+    db.session.bulk_insert_mappings(Show, [{
+        'venue_id': random.randint(1, venues),
+        'artist_id': random.randint(1, artists),
+        'start_time': now + timedelta(hours=random.randint(-24 * 365 * 3, 24 * 365))
+    } for _ in range(shows)])
+    db.session.commit()
+
+
+def explain(connection, statement, parameters):
+    if connection.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).fetchall()
+        plan = '\n'.join(row[0] for row in rows)
+        return plan, 'Seq Scan on "Show"' in plan
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    plan = '\n'.join(row[-1] for row in rows)
+    return plan, any(line.startswith('SCAN Show') for line in plan.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--database-url', default='sqlite://')
+    args = parser.parse_args()
+
+    from sqlalchemy import event
+    from app import create_app
+    from models import db, Venue, Artist, Show
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url})
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM "Show"' in statement and ('venue_id =' in statement or 'artist_id =' in statement):
+            captured.append((statement, parameters))
+
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        seed(db, Venue, Artist, Show, args.shows)
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        client = app.test_client()
+        for page in DETAIL_PAGES:
+            captured.clear()
+            path = page.format(venue_id=1, artist_id=1)
+            status = client.get(path).status_code
+            if status != 200:
+                print(f"FAIL {path}: HTTP {status}")
+                failures += 1
+                continue
+            event.remove(db.engine, 'before_cursor_execute', capture)
+            with db.engine.connect() as connection:
+                for statement, parameters in captured:
+                    plan, scans = explain(connection, statement, parameters)
+                    print(f"{'FAIL' if scans else 'ok  '} {path}\n{plan}\n")
+                    failures += scans
+            event.listen(db.engine, 'before_cursor_execute', capture)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Fill the database with deterministic synthetic venues, artists and shows.
+
+    python benchmarks/generate_data.py [--scale 10k|100k|1m | --shows N] [--seed N]
+                                       [--database-url URL] [--reset]
+
+The same seed and scale always produce the same rows, ids included: one
+venue per 50 shows and one artist per 20, spread over a fixed set of cities
+and the genres offered by the forms, with show times from two years before
+to four years after --anchor. Rows are written with one executemany per
+batch. Refuses to write into tables that already hold rows unless --reset
+drops and recreates them first.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+WORDS = ['the', 'musical', 'hop', 'park', 'square', 'live', 'music', 'coffee', 'dueling',
+         'pianos', 'bar', 'wild', 'sax', 'band', 'guns', 'petals', 'matt', 'quevado',
+         'blue', 'note', 'room', 'hall', 'club', 'lounge', 'jazz', 'rock', 'soul',
+         'velvet', 'echo', 'harbor', 'north', 'station', 'garden', 'cellar', 'union']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'),
+          ('Chicago', 'IL'), ('Nashville', 'TN'), ('Denver', 'CO'), ('Boston', 'MA'),
+          ('Los Angeles', 'CA'), ('Portland', 'OR'), ('Atlanta', 'GA'), ('Miami', 'FL')]
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+          'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+          'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+ANCHOR = datetime(2025, 1, 1)
+
+
+def counts(shows):
+    # (venues, artists, shows) for a show count
+    return max(shows // 50, 1), max(shows // 20, 1), shows
+
+
+def _name(rng, words):
+    return ' '.join(rng.sample(WORDS, words)).title()
+
+
+def _profile(rng, owner_id):
+    city, state = CITIES[min(int(rng.paretovariate(1.2)) - 1, len(CITIES) - 1)]
+    return {
+        'id': owner_id,
+        'city': city,
+        'state': state,
+        'phone': f'{rng.randrange(10 ** 9, 10 ** 10)}',
+        'image_link': f'https://images.example.com/{owner_id}.jpg',
+        'facebook_link': f'https://www.facebook.com/fyyur{owner_id}',
+        'website': f'https://www.example.com/{owner_id}',
+        'seeking_description': 'Looking for new acts' if rng.random() < 0.3 else None
+    }
+
+
+def venue_rows(rng, count):
+    for venue_id in range(1, count + 1):
+        row = _profile(rng, venue_id)
+        row.update(name=f'{_name(rng, 3)} {venue_id}', address=f'{rng.randrange(1, 2000)} Main St',
+                   seeking_talent=row['seeking_description'] is not None)
+        yield row
+
+
+def artist_rows(rng, count):
+    for artist_id in range(1, count + 1):
+        row = _profile(rng, artist_id)
+        row.update(name=f'{_name(rng, 2)} {artist_id}', seeking_venue=row['seeking_description'] is not None)
+        yield row
+
+
+def genre_links(rng, owner, count):
+    for owner_id in range(1, count + 1):
+        for genre_id in sorted(rng.sample(range(1, len(GENRES) + 1), rng.randint(1, 3))):
+            yield {owner: owner_id, 'genre_id': genre_id}
+
+
+def show_rows(rng, count, venues, artists, anchor):
+    # popular venues and artists get more shows. Shows start on the hour and
+    # last two hours; a slot that would double-book the venue or the artist
+    # is drawn again.
+    span = int(timedelta(days=6 * 365).total_seconds() // 3600)
+    start = anchor - timedelta(days=2 * 365)
+    booked = set()
+    for show_id in range(1, count + 1):
+        while True:
+            venue_id = min(int(rng.paretovariate(1.1)), venues) if rng.random() < 0.2 else rng.randint(1, venues)
+            artist_id = rng.randint(1, artists)
+            hour = rng.randrange(span)
+            slots = [('venue', venue_id, hour), ('venue', venue_id, hour + 1),
+                     ('artist', artist_id, hour), ('artist', artist_id, hour + 1)]
+            if booked.isdisjoint(slots):
+                break
+        booked.update(slots)
+        yield {
+            'id': show_id,
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start + timedelta(hours=hour),
+            'end_time': start + timedelta(hours=hour + 2)
+        }
+
+
+def insert(db, table, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def generate(db, shows, seed=1, anchor=ANCHOR, batch_size=10000):
+    # fill empty tables; returns (venues, artists, shows)
+    from models import Venue, Artist, Show, Genre, venue_genres, artist_genres
+
+    venues, artists, shows = counts(shows)
+    rng = random.Random(seed)
+    insert(db, Genre.__table__, ({'id': n, 'name': name} for n, name in enumerate(GENRES, 1)), batch_size)
+    insert(db, Venue.__table__, venue_rows(rng, venues), batch_size)
+    insert(db, venue_genres, genre_links(rng, 'venue_id', venues), batch_size)
+    insert(db, Artist.__table__, artist_rows(rng, artists), batch_size)
+    insert(db, artist_genres, genre_links(rng, 'artist_id', artists), batch_size)
+    insert(db, Show.__table__, show_rows(rng, shows, venues, artists, anchor), batch_size)
+    if db.engine.dialect.name == 'postgresql':
+        # ids were given explicitly, so move the sequences past them
+        for model in (Genre, Venue, Artist, Show):
+            db.session.execute(db.text(
+                f'SELECT setval(\'"{model.__tablename__}_id_seq"\', (SELECT max(id) FROM "{model.__tablename__}"))'))
+    db.session.commit()
+    return venues, artists, shows
+
+
+def is_empty(db):
+    from models import Venue, Artist, Show, Genre
+    return not any(db.session.query(model.id).first() for model in (Genre, Venue, Artist, Show))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    size.add_argument('--shows', type=int)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--anchor', type=datetime.fromisoformat, default=ANCHOR,
+                        help='show times run from two years before to four years after this date')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--database-url', default='sqlite:///fyyur-bench.db')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate every table first')
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url})
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if not is_empty(db):
+            sys.exit('the database already holds data; pass --reset to replace it')
+        start = time.perf_counter()
+        venues, artists, shows = generate(db, args.shows or SCALES[args.scale], args.seed, args.anchor,
+                                          args.batch_size)
+        print(f"{venues} venues, {artists} artists, {shows} shows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, has_app_context, make_response, request, session
+from werkzeug.http import is_resource_modified, quote_etag
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LRUCache:
+    # Thread-safe in-process LRU with a per-entry TTL, plus a table of
+    # invalidation tag versions that is never evicted.
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    # Cache shared by every worker on one host, stored in a local SQLite
+    # file. Entries expire after `ttl` seconds; tag versions live in their
+    # own table and are bumped atomically.
+
+    def __init__(self, path, ttl=60):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        # a SQLite connection must not be used on both sides of a fork
+        os.register_at_fork(after_in_child=self._forget_connections)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                               '(key TEXT PRIMARY KEY, expires REAL NOT NULL, value BLOB NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS versions '
+                               '(tag TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM entries WHERE key = ? AND expires >= ?', (key, time.time())
+        ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def set(self, key, value):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO entries (key, expires, value) VALUES (?, ?, ?)',
+            (key, time.time() + self.ttl, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        )
+
+    def versions(self, tags):
+        tags = list(tags)
+        versions = dict.fromkeys(tags, 0)
+        for start in range(0, len(tags), 500):
+            chunk = tags[start:start + 500]
+            versions.update(self._connect().execute(
+                'SELECT tag, version FROM versions WHERE tag IN (%s)' % ','.join('?' * len(chunk)), chunk
+            ).fetchall())
+        return versions
+
+    def bump(self, tags):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO versions (tag, version) VALUES (?, 1) '
+                'ON CONFLICT (tag) DO UPDATE SET version = version + 1',
+                [(tag,) for tag in tags]
+            )
+            connection.execute('DELETE FROM entries WHERE expires < ?', (time.time(),))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        self._connect().execute('DELETE FROM entries')
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+# a tag every invalidation bumps
+ANY_WRITE = '*'
+
+
+class ResponseCache:
+    # Rendered GET responses keyed by path and query string.
+    #
+    # Each entry records the versions of the tags it was rendered from, e.g.
+    # "venue:3" or "area:CA/San Francisco". A hit is served only while every
+    # one of those versions is unchanged, so write handlers invalidate pages
+    # by bumping the tags they touched. Entries are looked up in the
+    # in-process LRU first and then in the optional shared backend; tag
+    # versions live in the shared backend when there is one, so a bump in
+    # one worker invalidates the LRU copies held by all of them.
+    #
+    # A page's tags are only known once it has rendered, so set() cannot
+    # tell which versions its data was read at. Instead the caller reads
+    # generation() before rendering; if any invalidation happened since, a
+    # write may have committed after the page read the database, and the
+    # page is not stored.
+
+    def __init__(self, maxsize=1024, ttl=60, shared=None):
+        self.local = LRUCache(maxsize, ttl)
+        self.shared = shared
+
+    @property
+    def _versions(self):
+        return self.shared or self.local
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        if entry is None:
+            return None
+        versions, response = entry
+        if self._versions.versions(versions) != versions:
+            return None
+        return response
+
+    def generation(self):
+        return self._versions.versions([ANY_WRITE])[ANY_WRITE]
+
+    def set(self, key, tags, response, generation):
+        # ANY_WRITE read last, so a bump between reads shows up in it
+        versions = self._versions.versions([*tags, ANY_WRITE])
+        if versions.pop(ANY_WRITE) != generation:
+            return
+        entry = (versions, response)
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+
+    def invalidate(self, *tags):
+        self._versions.bump((ANY_WRITE, *tags))
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+def make_response_cache(config):
+    backend = config['RESPONSE_CACHE_SHARED_BACKEND']
+    shared = None
+    if backend:
+        if not backend.startswith('sqlite:///'):
+            raise ValueError(f"unsupported RESPONSE_CACHE_SHARED_BACKEND {backend!r}")
+        shared = SQLiteCache(backend[len('sqlite:///'):], config['RESPONSE_CACHE_TTL'])
+    return ResponseCache(config['RESPONSE_CACHE_SIZE'], config['RESPONSE_CACHE_TTL'], shared)
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+def area_tag(city, state):
+    return f"area:{state}/{city}"
+
+
+def cache_tags(*tags):
+    # record that the current response was rendered from `tags`; a no-op
+    # outside a cached view
+    recorded = g.get('cache_tags') if has_app_context() else None
+    if recorded is not None:
+        recorded.update(tags)
+
+
+def cached_page(response_cache=None):
+    # Serve GET requests for the decorated view from `response_cache`, by
+    # default the one create_app() gave the current app.
+    #
+    # Requests with pending flash messages bypass the cache, since the page
+    # would render them. Streamed responses are stored once the stream has
+    # been sent in full.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (not current_app.config['RESPONSE_CACHE_ENABLED']
+                    or request.method != 'GET' or '_flashes' in session):
+                return view(*args, **kwargs)
+
+            cache = response_cache if response_cache is not None else current_app.extensions['response_cache']
+            key = request.full_path
+            hit = cache.get(key)
+            if hit is not None:
+                body, mimetype = hit
+                response = current_app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            generation = cache.generation()
+            tags = g.cache_tags = set()
+            response = make_response(view(*args, **kwargs))
+            response.headers['X-Cache'] = 'MISS'
+            if response.status_code != 200:
+                return response
+            if not response.is_streamed:
+                cache.set(key, tags, (response.get_data(), response.mimetype), generation)
+                return response
+
+            def store(chunks, mimetype=response.mimetype):
+                body = []
+                for chunk in chunks:
+                    body.append(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+                    yield chunk
+                cache.set(key, tags, (b''.join(body), mimetype), generation)
+
+            response.response = store(response.response)
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_page(version):
+    # Conditional GET for the decorated view. `version` is called with the
+    # view's arguments and returns one of the (last_modified, values) pairs of
+    # queries.py, or None for a missing page. The response gets a weak ETag
+    # made from the values and the release (app.extensions['release']) plus
+    # Last-Modified, and a request whose If-None-Match or If-Modified-Since
+    # still matches is answered 304 before the view, or cached_page under
+    # it, runs.
+    #
+    # Requests with pending flash messages get the full page without
+    # validators, since the page would render them.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (not current_app.config['CONDITIONAL_GET_ENABLED']
+                    or request.method not in ('GET', 'HEAD') or '_flashes' in session):
+                return view(*args, **kwargs)
+
+            found = version(**kwargs)
+            if found is None:
+                return view(*args, **kwargs)
+            last_modified, values = found
+            etag = hashlib.sha1(repr((current_app.extensions['release'], values)).encode('utf-8')).hexdigest()
+            if is_resource_modified(request.environ, etag=quote_etag(etag, weak=True), last_modified=last_modified):
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            # stored copies are revalidated on every use
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
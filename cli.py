@@ -0,0 +1,123 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+#----------------------------------------------------------------------------#
+# `flask fyyur ...` commands.
+#----------------------------------------------------------------------------#
+
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='File format; by default taken from the file extension.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT batch and commit.')
+@click.option('--dry-run', is_flag=True, help='Validate and resolve every row without writing.')
+@click.option('--max-errors', default=20, show_default=True, help='Rejected rows to print.')
+def import_command(kind, path, format, batch_size, dry_run, max_errors):
+    """Bulk-load venues, artists or shows from a CSV or NDJSON file.
+
+    Rows are checked against the same rules as the create forms. Shows refer
+    to their artist and venue by artist_name/venue_name or artist_id/venue_id.
+    """
+    from importer import IMPORTERS, read_rows
+
+    if format is None:
+        format = FORMATS.get(os.path.splitext(path)[1].lower())
+        if format is None:
+            raise click.UsageError('cannot tell the format from the file name; pass --format')
+
+    def progress(report):
+        click.echo(f'\r{report.read} rows ({report.rate:,.0f} rows/s)', nl=False, err=True)
+
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    with stream:
+        importer = IMPORTERS[kind](batch_size=batch_size, dry_run=dry_run, max_errors=max_errors)
+        report = importer.run(read_rows(stream, format), progress)
+    click.echo(err=True)
+
+    for line, message in report.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    if report.rejected > len(report.errors):
+        click.echo(f'... and {report.rejected - len(report.errors)} more rejected rows', err=True)
+    click.echo(report.summary() + (' (dry run, nothing written)' if dry_run else ''))
+
+    if not dry_run and report.accepted:
+        # drop the shared cached pages; each worker's own copies expire
+        # within RESPONSE_CACHE_TTL
+        response_cache = current_app.extensions['response_cache']
+        response_cache.invalidate('venue-areas', 'artists', 'shows')
+        response_cache.clear()
+
+
+@fyyur_cli.command('compile-templates')
+def compile_templates_command():
+    """Compile every template into the on-disk bytecode cache.
+
+    Run at deploy time so new workers load compiled templates instead of
+    compiling them. Needs TEMPLATE_BYTECODE_CACHE on.
+    """
+    from app import precompile_templates
+
+    if current_app.jinja_env.bytecode_cache is None:
+        raise click.UsageError('TEMPLATE_BYTECODE_CACHE is off')
+    if current_app.jinja_env.cache is not None:
+        # templates create_app() already loaded would not be looked up again
+        current_app.jinja_env.cache.clear()
+    start = time.perf_counter()
+    count = precompile_templates(current_app)
+    click.echo(f'{count} templates compiled in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+
+@fyyur_cli.command('build-assets')
+def build_assets_command():
+    """Bundle, minify and fingerprint the files under static/.
+
+    Writes them to static/dist with gzip (and, if the brotli package is
+    installed, brotli) copies and a manifest that pages link through. Run at
+    deploy time, before the workers start; the previous build is replaced.
+    """
+    from assets import BUNDLES, build_assets
+
+    start = time.perf_counter()
+    manifest = build_assets(current_app.static_folder)
+    elapsed = time.perf_counter() - start
+
+    def size(entry, encoding):
+        value = entry['encodings'].get(encoding)
+        return '-' if value is None else f'{value / 1024:.1f}'
+
+    click.echo(f"{'asset':32} {'KiB':>8} {'gzip':>8} {'br':>8}  path")
+    for name in [*BUNDLES, *sorted(name for name in manifest if name not in BUNDLES)]:
+        entry = manifest[name]
+        click.echo(f"{name:32} {entry['size'] / 1024:8.1f} {size(entry, 'gzip'):>8} {size(entry, 'br'):>8}  {entry['path']}")
+    click.echo(f'{len(manifest)} assets built in {elapsed * 1000:.0f} ms')
+
+
+@fyyur_cli.command('rebuild-matches')
+def rebuild_matches_command():
+    """Recompute the suggested artists of every venue and venues of every artist.
+
+    Scores every venue against the artists seeking a venue, and every artist
+    against the venues seeking talent, by genres, location and past shows,
+    and replaces the Match table with the best MATCHES_PER_OWNER of each in
+    one transaction. Run it periodically; pages read the last result.
+    """
+    from matching import rebuild_matches
+
+    start = time.perf_counter()
+    count = rebuild_matches(current_app.config['MATCHES_PER_OWNER'])
+    click.echo(f'{count} matches written in {(time.perf_counter() - start) * 1000:.0f} ms')
@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    # gzip only
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Response compression.
+#----------------------------------------------------------------------------#
+
+# A streamed body is compressed as it is sent, and what has been compressed
+# so far is flushed to the client every this many bytes of input, so a page
+# streamed from a slow cursor still arrives in pieces.
+STREAM_FLUSH_BYTES = 4096
+
+
+class _Gzip:
+
+    def __init__(self, level):
+        # wbits 31: a gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def _compressor(encoding, config):
+    if encoding == 'br':
+        return brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+    return _Gzip(config['COMPRESS_GZIP_LEVEL'])
+
+
+def compress(data, encoding, config):
+    compressor = _compressor(encoding, config)
+    return compressor.process(data) + compressor.finish()
+
+
+def compress_stream(chunks, encoding, config):
+    compressor = _compressor(encoding, config)
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            output = compressor.process(chunk)
+            pending += len(chunk)
+            if pending >= STREAM_FLUSH_BYTES:
+                output += compressor.flush()
+                pending = 0
+            if output:
+                yield output
+        yield compressor.finish()
+    finally:
+        # stream_with_context ends the request once its iterable is closed
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def choose_encoding(accept_encodings):
+    # brotli when the client takes it and the package is installed, else gzip
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def init_compression(app):
+    # Compress responses on the way out, after every other after_request
+    # hook has run, so register this first. Only bodies of a type listed in
+    # COMPRESS_MIMETYPES are compressed: of at least COMPRESS_MIN_SIZE bytes,
+    # or streamed, whose size is not known up front. Responses that already
+    # have a Content-Encoding (the precompressed files under /static/dist),
+    # files sent from disk, partial content and `Cache-Control: no-transform`
+    # are left alone.
+    if not app.config['COMPRESS_ENABLED']:
+        return
+    mimetypes = frozenset(app.config['COMPRESS_MIMETYPES'])
+
+    @app.after_request
+    def compress_response(response):
+        if (response.mimetype not in mimetypes
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough
+                or response.cache_control.no_transform):
+            return response
+        data = None if response.is_streamed else response.get_data()
+        if data is not None and len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        # whether the body is compressed depends on the request from here on
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if data is None:
+            response.response = compress_stream(response.response, encoding, app.config)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = compress(data, encoding, app.config)
+            if len(body) >= len(data):
+                return response
+            response.set_data(body)
+        response.content_encoding = encoding
+        # the encoded body is not byte-for-byte the one a strong ETag named
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,14 @@
+#----------------------------------------------------------------------------#
+# gunicorn settings, read by `gunicorn wsgi:app` from the working directory.
+#----------------------------------------------------------------------------#
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# import and configure the app once in the master; workers are forked from
+# it with every module already loaded and share those pages copy-on-write.
+# create_app() makes each worker open its own database connections.
+preload_app = True
@@ -0,0 +1,338 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import json
+import time
+from datetime import timedelta
+from itertools import islice
+
+from sqlalchemy import func, select
+from werkzeug.datastructures import MultiDict
+from wtforms import DateTimeField
+from wtforms.validators import DataRequired, Optional
+
+from forms import ArtistForm, ShowForm, VenueForm
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres, MAX_SHOW_DURATION
+from queries import genres_named
+from scheduling import find_conflicts
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+def read_rows(stream, format):
+    # (line number, record) for every row of a CSV or NDJSON stream, read
+    # lazily; an NDJSON line that is not a JSON object yields None
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def form_data(row, booleans=()):
+    # a record as the form data the create pages would post: lists become
+    # repeated keys, CSV genres are comma separated, and boolean fields are
+    # only present when true
+    data = MultiDict()
+    for key, value in row.items():
+        if key == 'website':
+            # the name the model and the API export use
+            key = 'website_link'
+        if key in booleans:
+            if value is True or (isinstance(value, str) and value.strip().lower() in ('y', 'yes', 'true', '1')):
+                data.add(key, 'y')
+            continue
+        if value is None:
+            continue
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(',') if genre.strip()]
+        for item in value if isinstance(value, list) else [value]:
+            data.add(key, str(item))
+    return data
+
+#----------------------------------------------------------------------------#
+# Importers.
+#----------------------------------------------------------------------------#
+
+class ImportReport:
+
+    def __init__(self, max_errors=20):
+        self.read = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.read} rows read, {self.accepted} accepted, {self.rejected} rejected "
+                f"in {self.elapsed:.2f}s ({self.rate:,.0f} rows/s)")
+
+
+class Importer:
+    # Validates records with the same form as the matching create page and
+    # writes the valid ones in batches: one executemany per table and one
+    # commit per batch. On PostgreSQL psycopg2 pages each executemany into
+    # multi-row INSERT ... VALUES statements.
+
+    form_class = None
+    booleans = ()
+
+    def __init__(self, batch_size=5000, dry_run=False, max_errors=20):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.max_errors = max_errors
+        # one bound form, re-processed for every record
+        self.form = self.form_class(formdata=None, meta={'csrf': False})
+
+    def validate(self, row):
+        # (values, None) for a valid record, or (None, message)
+        self.form.process(form_data(row, self.booleans))
+        if not self.form.validate():
+            return None, "; ".join(f"{field}: {', '.join(errors)}" for field, errors in self.form.errors.items())
+        return self.values(self.form), None
+
+    def values(self, form):
+        raise NotImplementedError
+
+    def write(self, batch):
+        raise NotImplementedError
+
+    def run(self, rows, progress=None):
+        report = ImportReport(self.max_errors)
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+            batch, lines = [], []
+            for line, row in chunk:
+                report.read += 1
+                if row is None:
+                    report.reject(line, "not a JSON object")
+                    continue
+                values, error = self.validate(row)
+                if error is None:
+                    values, error = self.resolve(row, values)
+                if error is not None:
+                    report.reject(line, error)
+                    continue
+                batch.append(values)
+                lines.append(line)
+            rejected = self.check(batch)
+            if rejected:
+                for index, error in sorted(rejected.items()):
+                    report.reject(lines[index], error)
+                batch = [values for index, values in enumerate(batch) if index not in rejected]
+            if batch and not self.dry_run:
+                self.write(batch)
+                db.session.commit()
+            report.accepted += len(batch)
+            if progress is not None:
+                progress(report)
+        return report
+
+    def resolve(self, row, values):
+        return values, None
+
+    def check(self, batch):
+        # {index in batch: message} for the valid records that still cannot
+        # be written together
+        return {}
+
+
+def reserve_ids(model, count):
+    # primary keys for `count` new rows. PostgreSQL hands them out from the
+    # table's sequence, so concurrent writers are safe; elsewhere they follow
+    # the current maximum, so the import must be the only writer.
+    if db.engine.dialect.name == 'postgresql':
+        sequence = func.nextval(f'"{model.__tablename__}_id_seq"')
+        return db.session.execute(select(sequence).select_from(func.generate_series(1, count))).scalars().all()
+    start = (db.session.query(func.max(model.id)).scalar() or 0) + 1
+    return range(start, start + count)
+
+
+class ProfileImporter(Importer):
+    # venues and artists, with their genre links
+
+    model = None
+    genre_table = None
+    owner_column = None
+    # model column -> form field
+    columns = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.genre_ids = dict(db.session.query(Genre.name, Genre.id))
+
+    def values(self, form):
+        values = {column: form[field].data for column, field in self.columns.items()}
+        values['genres'] = form.genres.data
+        return values
+
+    def write(self, batch):
+        missing = {name for values in batch for name in values['genres']} - self.genre_ids.keys()
+        if missing:
+            genres = genres_named(sorted(missing))
+            db.session.flush()
+            self.genre_ids.update((genre.name, genre.id) for genre in genres)
+
+        links = []
+        for values, owner_id in zip(batch, reserve_ids(self.model, len(batch))):
+            values['id'] = owner_id
+            links.extend({self.owner_column: owner_id, 'genre_id': self.genre_ids[name]}
+                         for name in dict.fromkeys(values.pop('genres')))
+        db.session.execute(self.model.__table__.insert(), batch)
+        if links:
+            db.session.execute(self.genre_table.insert(), links)
+
+
+class VenueImporter(ProfileImporter):
+    form_class = VenueForm
+    booleans = ('seeking_talent',)
+    model = Venue
+    genre_table = venue_genres
+    owner_column = 'venue_id'
+    columns = {
+        'name': 'name',
+        'city': 'city',
+        'state': 'state',
+        'address': 'address',
+        'phone': 'phone',
+        'image_link': 'image_link',
+        'facebook_link': 'facebook_link',
+        'website': 'website_link',
+        'seeking_talent': 'seeking_talent',
+        'seeking_description': 'seeking_description'
+    }
+
+
+class ArtistImporter(ProfileImporter):
+    form_class = ArtistForm
+    booleans = ('seeking_venue',)
+    model = Artist
+    genre_table = artist_genres
+    owner_column = 'artist_id'
+    columns = {
+        'name': 'name',
+        'city': 'city',
+        'state': 'state',
+        'phone': 'phone',
+        'image_link': 'image_link',
+        'facebook_link': 'facebook_link',
+        'website': 'website_link',
+        'seeking_venue': 'seeking_venue',
+        'seeking_description': 'seeking_description'
+    }
+
+
+class ImportShowForm(ShowForm):
+    # ShowForm, also accepting the ISO 8601 times the /api/v1 exports write
+    start_time = DateTimeField(
+        'start_time',
+        validators=[DataRequired()],
+        format=['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
+                '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M']
+    )
+    # given by exports, else start_time plus duration
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()],
+        format=['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
+                '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M']
+    )
+
+
+AMBIGUOUS = object()
+
+
+class ShowImporter(Importer):
+    # Shows name their artist and venue by `artist_name` / `venue_name`
+    # (the natural keys, as in the /api/v1/shows export) or by `artist_id` /
+    # `venue_id`. Both sides are loaded once into name -> id maps; a name
+    # shared by several rows cannot be resolved and rejects the show, as does
+    # a booking overlapping another of its venue or artist.
+
+    form_class = ImportShowForm
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.artists, self.artist_ids = self.natural_keys(Artist)
+        self.venues, self.venue_ids = self.natural_keys(Venue)
+
+    @staticmethod
+    def natural_keys(model):
+        names, ids = {}, set()
+        for owner_id, name in db.session.query(model.id, model.name).yield_per(10000):
+            ids.add(owner_id)
+            names[name] = AMBIGUOUS if name in names else owner_id
+        return names, ids
+
+    def values(self, form):
+        start_time = form.start_time.data
+        return {'start_time': start_time,
+                'end_time': form.end_time.data or start_time + timedelta(minutes=form.duration.data)}
+
+    def validate(self, row):
+        values, error = super().validate(row)
+        if error is None and not values['start_time'] < values['end_time'] <= values['start_time'] + MAX_SHOW_DURATION:
+            return None, f"end_time: must be after start_time and at most {MAX_SHOW_DURATION // timedelta(hours=1)} hours later"
+        return values, error
+
+    def resolve(self, row, values):
+        for side, names, ids in (('artist', self.artists, self.artist_ids), ('venue', self.venues, self.venue_ids)):
+            name = row.get(f'{side}_name')
+            if name:
+                owner_id = names.get(name)
+                if owner_id is AMBIGUOUS:
+                    return None, f"{side}_name: more than one {side} is named {name!r}"
+            else:
+                try:
+                    owner_id = int(row.get(f'{side}_id') or '')
+                except (TypeError, ValueError):
+                    return None, f"{side}_id: {side}_name or a numeric {side}_id is required"
+                if owner_id not in ids:
+                    owner_id = None
+            if owner_id is None:
+                return None, f"{side}: no {side} {name or row.get(f'{side}_id')!r}"
+            values[f'{side}_id'] = owner_id
+        return values, None
+
+    def check(self, batch):
+        # overlapping bookings of a venue or an artist, in the database (which
+        # holds the earlier batches) or within the batch
+        return find_conflicts(batch)
+
+    def write(self, batch):
+        db.session.execute(Show.__table__.insert(), batch)
+
+
+IMPORTERS = {
+    'venues': VenueImporter,
+    'artists': ArtistImporter,
+    'shows': ShowImporter
+}
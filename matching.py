@@ -0,0 +1,228 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import heapq
+from datetime import datetime
+
+from sqlalchemy import and_, delete, func, insert, select
+
+from forms import GENRE_CHOICES
+from models import db, Venue, Artist, Show, Genre, Match, venue_genres, artist_genres
+
+#----------------------------------------------------------------------------#
+# Scores.
+#----------------------------------------------------------------------------#
+
+# Genres as bitsets: bit i stands for GENRE_CHOICES[i]. Genres the forms do
+# not offer are ignored.
+GENRE_BITS = {name: 1 << bit for bit, (name, label) in enumerate(GENRE_CHOICES)}
+
+# A match scores the Jaccard similarity of the two genre sets (0 to 1), plus
+# SAME_CITY when both are in the same city or SAME_STATE when only the state
+# is shared, plus PAST_SHOW for every show they have already played together,
+# counting at most PAST_SHOWS_COUNTED of them.
+SAME_CITY = 0.5
+SAME_STATE = 0.25
+PAST_SHOW = 0.25
+PAST_SHOWS_COUNTED = 4
+
+
+def genre_similarity(bits, other):
+    union = bits | other
+    return bin(bits & other).count('1') / bin(union).count('1') if union else 0.0
+
+
+def location_score(profile, other):
+    if profile[2] != other[2]:
+        return 0.0
+    return SAME_CITY if profile[1] == other[1] else SAME_STATE
+
+
+def past_show_score(count):
+    return PAST_SHOW * min(count, PAST_SHOWS_COUNTED)
+
+#----------------------------------------------------------------------------#
+# Candidates.
+#----------------------------------------------------------------------------#
+
+class CandidatePool:
+    # The venues or artists that can be suggested, grouped by genre bitset
+    # and, within a group, by state and city. A profile's best candidates
+    # are found by walking the groups in order of genre similarity and
+    # stopping once no later group can score higher, even with the location
+    # bonus, than the ones already found; the order of the groups is worked
+    # out once per genre bitset. Nothing scores every pair.
+
+    def __init__(self, profiles):
+        # profiles: id -> (bits, city, state), ids in ascending order
+        self.profiles = profiles
+        self.groups = {}
+        for owner_id, (bits, city, state) in profiles.items():
+            group = self.groups.setdefault(bits, {'all': [], 'state': {}, 'city': {}})
+            group['all'].append(owner_id)
+            group['state'].setdefault(state, []).append(owner_id)
+            group['city'].setdefault((city, state), []).append(owner_id)
+        self._orders = {}
+        # many venues and artists share a profile, and so these results
+        self._best = {}
+
+    def _order(self, bits):
+        order = self._orders.get(bits)
+        if order is None:
+            order = sorted(((genre_similarity(bits, other), other) for other in self.groups), reverse=True)
+            self._orders[bits] = order
+        return order
+
+    def best(self, profile, limit):
+        # the `limit` best (score, id) by genre and location alone, best
+        # first; ties go to the lower id
+        key = (profile, limit)
+        if key not in self._best:
+            self._best[key] = self._rank(profile, limit)
+        return self._best[key]
+
+    def _rank(self, profile, limit):
+        bits, city, state = profile
+        heap = []
+
+        def offer(score, ids, skip=None):
+            # ids are ascending, so after `limit` of them the rest tie lower
+            taken = 0
+            for owner_id in ids:
+                if taken == limit:
+                    break
+                if skip is not None and skip(owner_id):
+                    continue
+                taken += 1
+                entry = (score, -owner_id)
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                else:
+                    break
+
+        profiles = self.profiles
+        for similarity, group_bits in self._order(bits):
+            # groups that can only tie the worst kept may still hold lower ids
+            if len(heap) == limit and similarity + SAME_CITY < heap[0][0]:
+                break
+            group = self.groups[group_bits]
+            offer(similarity + SAME_CITY, group['city'].get((city, state), ()))
+            offer(similarity + SAME_STATE, group['state'].get(state, ()),
+                  lambda owner_id: profiles[owner_id][1] == city)
+            offer(similarity, group['all'], lambda owner_id: profiles[owner_id][2] == state)
+        return [(score, -negative_id) for score, negative_id in sorted(heap, reverse=True)]
+
+    def matches(self, profile, past_shows, limit):
+        # the `limit` best (score, id), best first, counting the shows
+        # already played with each candidate (past_shows: id -> count).
+        # Past shows only add to a score, so the best overall are among the
+        # best by genre and location and the candidates with past shows.
+        scores = {owner_id: score for score, owner_id in self.best(profile, limit)}
+        for owner_id in past_shows:
+            other = self.profiles.get(owner_id)
+            if other is not None and owner_id not in scores:
+                scores[owner_id] = genre_similarity(profile[0], other[0]) + location_score(profile, other)
+        ranked = [(score + past_show_score(past_shows.get(owner_id, 0)), owner_id)
+                  for owner_id, score in scores.items()]
+        return heapq.nsmallest(limit, ranked, key=lambda match: (-match[0], match[1]))
+
+#----------------------------------------------------------------------------#
+# Rebuild.
+#----------------------------------------------------------------------------#
+
+def _profiles(model, genre_table, owner_column):
+    # id -> (genre bitset, city, state, seeking), in two statements
+    bits = {}
+    links = select(genre_table.c[owner_column], Genre.name).join(Genre, Genre.id == genre_table.c.genre_id)
+    for owner_id, name in db.session.execute(links):
+        bits[owner_id] = bits.get(owner_id, 0) | GENRE_BITS.get(name, 0)
+    seeking = model.seeking_talent if model is Venue else model.seeking_venue
+    rows = db.session.execute(select(model.id, model.city, model.state, seeking).order_by(model.id))
+    return {
+        owner_id: (bits.get(owner_id, 0), (city or '').strip().lower(), (state or '').strip().upper(), is_seeking)
+        for owner_id, city, state, is_seeking in rows
+    }
+
+
+def _past_shows(now):
+    # venue id -> {artist id: shows}, and artist id -> {venue id: shows}
+    by_venue, by_artist = {}, {}
+    rows = db.session.execute(
+        select(Show.venue_id, Show.artist_id, func.count())
+        .where(Show.start_time <= now)
+        .group_by(Show.venue_id, Show.artist_id)
+    )
+    for venue_id, artist_id, count in rows:
+        by_venue.setdefault(venue_id, {})[artist_id] = count
+        by_artist.setdefault(artist_id, {})[venue_id] = count
+    return by_venue, by_artist
+
+
+def rebuild_matches(limit=20, now=None, batch_size=10000):
+    # Replaces the Match table, in one transaction: for every venue the
+    # `limit` best artists seeking a venue, and for every artist the `limit`
+    # best venues seeking talent. Returns the number of rows written.
+    now = now or datetime.now()
+    venues = _profiles(Venue, venue_genres, 'venue_id')
+    artists = _profiles(Artist, artist_genres, 'artist_id')
+    past_by_venue, past_by_artist = _past_shows(now)
+
+    pairs = {}
+    for owners, candidates, past, rank_index in (
+        (venues, artists, past_by_venue, 1),
+        (artists, venues, past_by_artist, 2),
+    ):
+        pool = CandidatePool({owner_id: profile[:3] for owner_id, profile in candidates.items() if profile[3]})
+        for owner_id, profile in owners.items():
+            for rank, (score, other_id) in enumerate(pool.matches(profile[:3], past.get(owner_id, {}), limit), 1):
+                key = (owner_id, other_id) if rank_index == 1 else (other_id, owner_id)
+                pairs.setdefault(key, [score, None, None])[rank_index] = rank
+
+    db.session.execute(delete(Match))
+    rows = [{'venue_id': venue_id, 'artist_id': artist_id, 'score': score,
+             'venue_rank': venue_rank, 'artist_rank': artist_rank}
+            for (venue_id, artist_id), (score, venue_rank, artist_rank) in pairs.items()]
+    for offset in range(0, len(rows), batch_size):
+        db.session.execute(insert(Match), rows[offset:offset + batch_size])
+    db.session.commit()
+    return len(rows)
+
+#----------------------------------------------------------------------------#
+# Lookups.
+#----------------------------------------------------------------------------#
+
+def _suggestions(owner, rank, other, key, other_key, owner_id, limit):
+    # the owner's name and its suggestions, best first, in one statement:
+    # the owner by primary key, outer-joined to its ranked matches through
+    # the (owner id, rank) index. None when there is no such owner.
+    rows = db.session.execute(
+        select(owner.name.label('owner_name'), other.id, other.name, other.city, other.state,
+               other.image_link)
+        .select_from(owner)
+        .outerjoin(Match, and_(key == owner.id, rank <= limit))
+        .outerjoin(other, other.id == other_key)
+        .where(owner.id == owner_id)
+        .order_by(rank)
+    ).all()
+    if not rows:
+        return None
+    return {
+        'id': owner_id,
+        'name': rows[0].owner_name,
+        'suggestions': [
+            {'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state,
+             'image_link': row.image_link}
+            for row in rows if row.id is not None
+        ],
+    }
+
+
+def suggested_artists(venue_id, limit=20):
+    return _suggestions(Venue, Match.venue_rank, Artist, Match.venue_id, Match.artist_id, venue_id, limit)
+
+
+def suggested_venues(artist_id, limit=20):
+    return _suggestions(Artist, Match.artist_rank, Venue, Match.artist_id, Match.venue_id, artist_id, limit)
@@ -0,0 +1,362 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import fcntl
+import glob
+import os
+import pickle
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, g, request
+from sqlalchemy import event, exc
+
+#----------------------------------------------------------------------------#
+# Registry.
+#----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+STARTUP_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'fyyur_requests_total': ('counter', 'Requests handled, by endpoint, method and status.', None),
+    'fyyur_request_duration_seconds': (
+        'histogram', 'Time from the start of a request until its response has been sent.', LATENCY_BUCKETS),
+    'fyyur_requests_in_flight': ('gauge', 'Requests being handled right now.', None),
+    'fyyur_template_render_seconds': ('histogram', 'Time spent rendering each page template.', LATENCY_BUCKETS),
+    'fyyur_response_cache_total': ('counter', 'Response cache lookups, by endpoint and result.', None),
+    'fyyur_db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.', None),
+    'fyyur_db_pool_checkout_seconds': (
+        'histogram', 'Time spent getting a connection from the pool, waiting included.', WAIT_BUCKETS),
+    'fyyur_db_pool_timeouts_total': ('counter', 'Checkouts that gave up waiting for a connection.', None),
+    'fyyur_db_pool_checked_out': ('gauge', 'Connections currently checked out.', None),
+    'fyyur_db_pool_overflow': ('gauge', 'Connections open beyond the pool size.', None),
+    'fyyur_db_pool_size': ('gauge', 'Configured pool size.', None),
+    'fyyur_startup_seconds': (
+        'histogram', 'Process startup by phase: imports, create_app() and the first request.', STARTUP_BUCKETS),
+}
+
+
+class Metrics:
+    # Counters, gauges and histograms for one process.
+    #
+    # With a `directory`, each worker process also writes a snapshot of its
+    # values to <directory>/<pid>.metrics every `flush_interval` seconds from
+    # a background thread, and render() adds up the snapshots of every
+    # worker. Counters and histograms of workers that have exited are kept
+    # (folded into one file), their gauges are dropped.
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # also run in a forked worker, which must not report its parent's
+        # values and does not inherit its flush thread
+        self.pid = os.getpid()
+        self.values = {}
+        if self.directory is not None:
+            threading.Thread(target=self._flush_periodically, args=(self.pid,), daemon=True).start()
+
+    def _flush_periodically(self, pid):
+        while self.pid == pid:
+            time.sleep(self.flush_interval)
+            if self.pid == os.getpid():
+                self.flush()
+
+    def _state(self):
+        if self.pid != os.getpid():
+            self._reset()
+        return self.values
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            values = self._state()
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._state()[(name, tuple(labels.items()))] = value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            values = self._state()
+            histogram = values.get(key)
+            if histogram is None:
+                # one count per bucket, then +Inf, then the sum
+                histogram = values[key] = [0] * (len(buckets) + 2)
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self._state().items()}
+
+    # multi-process aggregation
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.metrics')
+
+    def flush(self):
+        if self.directory is None:
+            return
+        snapshot = self.snapshot()
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as output:
+            pickle.dump(snapshot, output, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self._path(self.pid))
+
+    def collect(self):
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        with open(os.path.join(self.directory, 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._fold_exited()
+            merged = {}
+            for path in glob.glob(os.path.join(self.directory, '*.metrics')):
+                try:
+                    with open(path, 'rb') as snapshot:
+                        _merge(merged, pickle.load(snapshot))
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    continue
+        return merged
+
+    def _fold_exited(self):
+        # add the counters and histograms of exited workers to exited.metrics
+        exited_path = os.path.join(self.directory, 'exited.metrics')
+        exited, paths = None, []
+        for path in glob.glob(os.path.join(self.directory, '*.metrics')):
+            pid = os.path.basename(path).split('.')[0]
+            if not pid.isdigit() or _alive(int(pid)):
+                continue
+            if exited is None:
+                exited = _load(exited_path)
+            snapshot = _load(path)
+            _merge(exited, {key: value for key, value in snapshot.items() if METRICS[key[0]][0] != 'gauge'})
+            paths.append(path)
+        if exited is not None:
+            handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as output:
+                pickle.dump(exited, output, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, exited_path)
+            for path in paths:
+                os.unlink(path)
+
+    def render(self):
+        return render_text(self.collect())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load(path):
+    try:
+        with open(path, 'rb') as snapshot:
+            return pickle.load(snapshot)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {}
+
+
+def _merge(merged, snapshot):
+    for key, value in snapshot.items():
+        current = merged.get(key)
+        if current is None:
+            merged[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            merged[key] = [a + b for a, b in zip(current, value)]
+        else:
+            merged[key] = current + value
+
+#----------------------------------------------------------------------------#
+# Text exposition format.
+#----------------------------------------------------------------------------#
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_text(values):
+    by_name = {}
+    for (name, labels), value in values.items():
+        by_name.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, (kind, help, buckets) in METRICS.items():
+        samples = sorted(by_name.get(name, ()))
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+#----------------------------------------------------------------------------#
+# Flask and SQLAlchemy hooks.
+#----------------------------------------------------------------------------#
+
+def _timed_template_class(base, metrics):
+    # Flask's render signals need blinker, so top-level renders are timed
+    # here instead; extends and include render through the parent template
+    class TimedTemplate(base):
+
+        def render(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().render(*args, **kwargs)
+            finally:
+                metrics.observe('fyyur_template_render_seconds', {'template': self.name},
+                                time.perf_counter() - start)
+
+        def generate(self, *args, **kwargs):
+            # streamed pages: the time spent producing chunks, not sending them
+            elapsed = 0.0
+            chunks = super().generate(*args, **kwargs)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - start
+                    yield chunk
+            finally:
+                metrics.observe('fyyur_template_render_seconds', {'template': self.name}, elapsed)
+
+    return TimedTemplate
+
+
+def _instrument_pool(pool, metrics):
+    if getattr(pool.connect, 'metrics', None) is metrics:
+        return
+    connect = pool.connect
+
+    @wraps(connect)
+    def timed_connect(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return connect(*args, **kwargs)
+        except exc.TimeoutError:
+            metrics.inc('fyyur_db_pool_timeouts_total', {})
+            raise
+        finally:
+            metrics.observe('fyyur_db_pool_checkout_seconds', {}, time.perf_counter() - start)
+
+    timed_connect.metrics = metrics
+    pool.connect = timed_connect
+    event.listen(pool, 'checkout', lambda *args: metrics.inc('fyyur_db_pool_checkouts_total', {}))
+
+
+def _pool_gauges(pool, metrics):
+    for name, attribute in (('fyyur_db_pool_checked_out', 'checkedout'),
+                            ('fyyur_db_pool_overflow', 'overflow'),
+                            ('fyyur_db_pool_size', 'size')):
+        if hasattr(pool, attribute):
+            metrics.set(name, {}, max(getattr(pool, attribute)(), 0))
+
+
+def init_metrics(app, db, metrics):
+    app.jinja_env.template_class = _timed_template_class(app.jinja_env.template_class, metrics)
+
+    @app.before_request
+    def start_request_metrics():
+        _instrument_pool(db.engine.pool, metrics)
+        g.metrics_started = time.perf_counter()
+        metrics.inc('fyyur_requests_in_flight', {})
+
+    @app.after_request
+    def record_response_metrics(response):
+        g.metrics_status = response.status_code
+        cache = response.headers.get('X-Cache')
+        if cache is not None:
+            metrics.inc('fyyur_response_cache_total', {'endpoint': request.endpoint, 'result': cache.lower()})
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(error=None):
+        # teardown runs once a streamed body has been sent, so the latency
+        # covers the whole response
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        labels = {'endpoint': request.endpoint or 'unmatched', 'method': request.method}
+        metrics.observe('fyyur_request_duration_seconds', labels, time.perf_counter() - started)
+        metrics.inc('fyyur_requests_total', dict(labels, status=str(g.get('metrics_status', 500))))
+        metrics.inc('fyyur_requests_in_flight', {}, -1)
+        _pool_gauges(db.engine.pool, metrics)
+
+
+def init_startup_report(app, metrics, import_seconds, create_seconds):
+    # log and record how long this process spent importing the app and in
+    # create_app(), then how long each worker process takes to answer its
+    # first request, the one that pays for anything not done up front
+    app.logger.info("startup: imports %.1f ms, create_app %.1f ms", import_seconds * 1000, create_seconds * 1000)
+    metrics.observe('fyyur_startup_seconds', {'phase': 'import'}, import_seconds)
+    metrics.observe('fyyur_startup_seconds', {'phase': 'create_app'}, create_seconds)
+    first = {'pid': None}
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_first_request():
+        if first['pid'] == os.getpid():
+            return
+        with lock:
+            if first['pid'] != os.getpid():
+                first['pid'] = os.getpid()
+                g.first_request_started = time.perf_counter()
+
+    @app.teardown_request
+    def finish_first_request(error=None):
+        started = g.pop('first_request_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        metrics.observe('fyyur_startup_seconds', {'phase': 'first_request'}, elapsed)
+        app.logger.info("first request of process %d: %s in %.1f ms", os.getpid(), request.path, elapsed * 1000)
+
+
+def metrics_response(metrics):
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
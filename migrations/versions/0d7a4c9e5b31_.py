@@ -0,0 +1,40 @@
+"""listing sort keys not null
+
+Revision ID: 0d7a4c9e5b31
+Revises: f19b6d3e2c84
+Create Date: 2026-10-19 10:06:52.481730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0d7a4c9e5b31'
+down_revision = 'f19b6d3e2c84'
+branch_labels = None
+depends_on = None
+
+# the columns the /venues and /artists keysets order by, plus the venue name
+COLUMNS = {
+    'Venue': {'name': sa.String(), 'city': sa.String(length=120), 'state': sa.String(length=120)},
+    'Artist': {'name': sa.String()},
+}
+
+
+def upgrade():
+    # the forms require these, so NULLs only come from rows written around
+    # them; they become the empty string, which sorts first
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            op.execute(f'UPDATE "{table}" SET {column} = \'\' WHERE {column} IS NULL')
+        with op.batch_alter_table(table) as batch_op:
+            for column, type_ in columns.items():
+                batch_op.alter_column(column, existing_type=type_, nullable=False)
+
+
+def downgrade():
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column, type_ in columns.items():
+                batch_op.alter_column(column, existing_type=type_, nullable=True)
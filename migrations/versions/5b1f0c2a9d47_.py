@@ -0,0 +1,47 @@
+"""trigram and full-text search indexes
+
+Revision ID: 5b1f0c2a9d47
+Revises: e6c1f3a8b259
+Create Date: 2026-10-18 10:12:41.208815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c2a9d47'
+down_revision = 'e6c1f3a8b259'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm and tsvector GIN indexes only exist on PostgreSQL; other
+    # databases fall back to a LIKE scan in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'Venue', ['name'], postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_venue_city_trgm', 'Venue', ['city'], postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'})
+    op.create_index('ix_venue_state_trgm', 'Venue', ['state'], postgresql_using='gin', postgresql_ops={'state': 'gin_trgm_ops'})
+    op.create_index('ix_artist_name_trgm', 'Artist', ['name'], postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.execute(
+        'CREATE INDEX ix_venue_search_tsv ON "Venue" USING gin '
+        "(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || coalesce(state, '')))"
+    )
+    op.execute(
+        'CREATE INDEX ix_artist_search_tsv ON "Artist" USING gin '
+        "(to_tsvector('simple', coalesce(name, '')))"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_artist_search_tsv', table_name='Artist')
+    op.drop_index('ix_venue_search_tsv', table_name='Venue')
+    op.drop_index('ix_artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_venue_state_trgm', table_name='Venue')
+    op.drop_index('ix_venue_city_trgm', table_name='Venue')
+    op.drop_index('ix_venue_name_trgm', table_name='Venue')
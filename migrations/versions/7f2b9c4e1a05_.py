@@ -0,0 +1,52 @@
+"""updated_at on venues, artists and shows
+
+Revision ID: 7f2b9c4e1a05
+Revises: d41a9b5c7e20
+Create Date: 2026-10-18 21:04:17.552918
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2b9c4e1a05'
+down_revision = 'd41a9b5c7e20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('Artist', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('Show', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # backfill: venues and artists were last changed no earlier than they were
+    # created; for shows, now is the only safe answer
+    for name in ('Venue', 'Artist'):
+        table = sa.table(name, sa.column('created_at', sa.DateTime), sa.column('updated_at', sa.DateTime))
+        op.execute(table.update().values(updated_at=table.c.created_at))
+    show = sa.table('Show', sa.column('updated_at', sa.DateTime))
+    op.execute(show.update().values(updated_at=datetime.utcnow()))
+
+    for name in ('Venue', 'Artist', 'Show'):
+        with op.batch_alter_table(name) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index('ix_venue_updated_at', 'Venue', ['updated_at'], unique=False)
+    op.create_index('ix_artist_updated_at', 'Artist', ['updated_at'], unique=False)
+    op.create_index('ix_show_updated_at', 'Show', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_updated_at', table_name='Show')
+    op.drop_index('ix_artist_updated_at', table_name='Artist')
+    op.drop_index('ix_venue_updated_at', table_name='Venue')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('updated_at')
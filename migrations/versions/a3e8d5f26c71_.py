@@ -0,0 +1,81 @@
+"""show end_time and no overlapping bookings
+
+Revision ID: a3e8d5f26c71
+Revises: 7f2b9c4e1a05
+Create Date: 2026-10-18 22:37:05.104392
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e8d5f26c71'
+down_revision = '7f2b9c4e1a05'
+branch_labels = None
+depends_on = None
+
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    # backfill: every show runs for DEFAULT_SHOW_DURATION, cut short where the
+    # next show of its venue or of its artist starts, so existing double
+    # bookings do not break the constraints below. Of shows starting at the
+    # same time at the same venue or with the same artist, all but the first
+    # become empty ([start, start) overlaps nothing).
+    show = sa.table(
+        'Show', sa.column('id', sa.Integer), sa.column('venue_id', sa.Integer),
+        sa.column('artist_id', sa.Integer), sa.column('start_time', sa.DateTime),
+        sa.column('end_time', sa.DateTime)
+    )
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(show.c.id, show.c.venue_id, show.c.artist_id, show.c.start_time)).fetchall()
+    end_times = {row.id: row.start_time + DEFAULT_SHOW_DURATION for row in rows}
+    for side in ('venue_id', 'artist_id'):
+        # walked backwards, `following` is the show after `row` in that order
+        following = next_start = None
+        for row in sorted(rows, key=lambda row: (getattr(row, side), row.start_time, row.id), reverse=True):
+            if following is None or getattr(following, side) != getattr(row, side):
+                next_start = None
+            elif following.start_time > row.start_time:
+                next_start = following.start_time
+            else:
+                end_times[following.id] = following.start_time
+            if next_start is not None and next_start < end_times[row.id]:
+                end_times[row.id] = next_start
+            following = row
+    updates = [{'show_id': show_id, 'new_end_time': end_time} for show_id, end_time in end_times.items()]
+    statement = show.update().where(show.c.id == sa.bindparam('show_id')).values(end_time=sa.bindparam('new_end_time'))
+    for offset in range(0, len(updates), 10000):
+        bind.execute(statement, updates[offset:offset + 10000])
+
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+    # no two shows of a venue, or of an artist, may overlap; btree_gist lets
+    # the integer ids share a GiST index with the ranges. Elsewhere
+    # scheduling.find_conflicts() is the only check.
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute(
+        'ALTER TABLE "Show" ADD CONSTRAINT ex_show_venue_booking EXCLUDE USING gist '
+        '(venue_id WITH =, tsrange(start_time, end_time) WITH &&)'
+    )
+    op.execute(
+        'ALTER TABLE "Show" ADD CONSTRAINT ex_show_artist_booking EXCLUDE USING gist '
+        '(artist_id WITH =, tsrange(start_time, end_time) WITH &&)'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('ex_show_artist_booking', 'Show')
+        op.drop_constraint('ex_show_venue_booking', 'Show')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
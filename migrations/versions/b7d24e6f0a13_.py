@@ -0,0 +1,104 @@
+"""normalize genres into a Genre table
+
+Revision ID: b7d24e6f0a13
+Revises: 9c3e7a41d2b8
+Create Date: 2026-10-18 12:20:54.390112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d24e6f0a13'
+down_revision = '9c3e7a41d2b8'
+branch_labels = None
+depends_on = None
+
+
+def split_genres(value):
+    # genres were saved as "A,B" by the create handlers and, by the old edit
+    # handlers, as a Postgres array literal such as {A,"Hip Hop"}
+    if not value:
+        return []
+    value = value.strip().strip('{}')
+    return [genre.strip().strip('"').strip() for genre in value.split(',') if genre.strip().strip('"').strip()]
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    venue_genres = op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genres_genre_id_venue_id', 'venue_genres', ['genre_id', 'venue_id'], unique=False)
+    artist_genres = op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genres_genre_id_artist_id', 'artist_genres', ['genre_id', 'artist_id'], unique=False)
+
+    # backfill from the old comma separated strings
+    connection = op.get_bind()
+    genre_ids = {}
+
+    def links(table, owner):
+        rows = []
+        for owner_id, value in connection.execute(sa.select(table.c.id, table.c.genres)):
+            for name in dict.fromkeys(split_genres(value)):
+                if name not in genre_ids:
+                    genre_ids[name] = connection.execute(
+                        genre.insert().values(name=name)).inserted_primary_key[0]
+                rows.append({owner: owner_id, 'genre_id': genre_ids[name]})
+        return rows
+
+    venue = sa.table('Venue', sa.column('id', sa.Integer), sa.column('genres', sa.String))
+    artist = sa.table('Artist', sa.column('id', sa.Integer), sa.column('genres', sa.String))
+    venue_links = links(venue, 'venue_id')
+    artist_links = links(artist, 'artist_id')
+    if venue_links:
+        op.bulk_insert(venue_genres, venue_links)
+    if artist_links:
+        op.bulk_insert(artist_genres, artist_links)
+
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('genres')
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.drop_column('genres')
+
+
+def downgrade():
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+
+    connection = op.get_bind()
+    for owner, link in (('Venue', 'venue_genres'), ('Artist', 'artist_genres')):
+        owner_id = f"{owner.lower()}_id"
+        joined = {}
+        for row_id, name in connection.execute(sa.text(
+                f'SELECT l.{owner_id}, g.name FROM {link} l JOIN "Genre" g ON g.id = l.genre_id '
+                f'ORDER BY l.{owner_id}, g.name')):
+            joined.setdefault(row_id, []).append(name)
+        for row_id, names in joined.items():
+            connection.execute(
+                sa.text(f'UPDATE "{owner}" SET genres = :genres WHERE id = :id'),
+                {'genres': ','.join(names), 'id': row_id})
+
+    op.drop_index('ix_artist_genres_genre_id_artist_id', table_name='artist_genres')
+    op.drop_table('artist_genres')
+    op.drop_index('ix_venue_genres_genre_id_venue_id', table_name='venue_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('Genre')
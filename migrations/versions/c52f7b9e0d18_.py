@@ -0,0 +1,37 @@
+"""venue/artist match rankings
+
+Revision ID: c52f7b9e0d18
+Revises: a3e8d5f26c71
+Create Date: 2026-10-19 00:12:48.630157
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52f7b9e0d18'
+down_revision = 'a3e8d5f26c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Match',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('venue_rank', sa.Integer(), nullable=True),
+    sa.Column('artist_rank', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'artist_id')
+    )
+    op.create_index('ix_match_venue_id_venue_rank', 'Match', ['venue_id', 'venue_rank'], unique=False)
+    op.create_index('ix_match_artist_id_artist_rank', 'Match', ['artist_id', 'artist_rank'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_match_artist_id_artist_rank', table_name='Match')
+    op.drop_index('ix_match_venue_id_venue_rank', table_name='Match')
+    op.drop_table('Match')
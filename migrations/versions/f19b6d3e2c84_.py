@@ -0,0 +1,32 @@
+"""deletion times for Last-Modified
+
+Revision ID: f19b6d3e2c84
+Revises: c52f7b9e0d18
+Create Date: 2026-10-19 09:41:26.207413
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19b6d3e2c84'
+down_revision = 'c52f7b9e0d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Deletion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deletion_table_name_deleted_at', 'Deletion', ['table_name', 'deleted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_deletion_table_name_deleted_at', table_name='Deletion')
+    op.drop_table('Deletion')
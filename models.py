@@ -3,42 +3,68 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-from flask import Flask
+from datetime import datetime, timedelta
+
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from forms import *
-from flask_migrate import Migrate
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
+# bound to an app by create_app() in app.py, which also sets up Flask-Migrate
+moment = Moment()
+db = SQLAlchemy()
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
 
-# TODO: connect to a local postgresql database
+    def __repr__(self):
+        return f"<Genre id={self.id} name={self.name}>"
 
-migrate = Migrate(app, db)
+# (genre_id, owner_id) indexes answer the genre filters on the listings
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id')
+)
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_city_state', 'city', 'state'),
+        db.Index('ix_venue_state_city_id', 'state', 'city', 'id'),
+        db.Index('ix_venue_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    # NOT NULL: the listings page by keyset on (state, city, id), and a NULL
+    # compares as neither before nor after a cursor
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship("Genre", secondary=venue_genres, lazy="select", order_by="Genre.name")
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    shows = db.relationship("Show", backref="venues", lazy=False, cascade="all, delete-orphan")
+    # moves on every edit, including genre-only ones (set by the edit views),
+    # and feeds the page versions in queries.py
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    shows = db.relationship("Show", backref="venues", lazy="select", cascade="all, delete-orphan")
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 def __repr__(self):
@@ -46,33 +72,94 @@ def __repr__(self):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    # NOT NULL, like the venue's, for the keyset on (name, id)
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship("Genre", secondary=artist_genres, lazy="select", order_by="Genre.name")
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    shows = db.relationship("Show", backref="artists", lazy=False, cascade="all, delete-orphan")
+    # moves on every edit, including genre-only ones (set by the edit views),
+    # and feeds the page versions in queries.py
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    shows = db.relationship("Show", backref="artists", lazy="select", cascade="all, delete-orphan")
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 def __repr__(self):
     return f"<Venue id={self.id} name={self.name} city={self.city} state={self.state}>"
 
+# Shows last [start_time, end_time). The conflict check in scheduling.py only
+# looks this far back for a booking still running, so no show may be longer.
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+
+def default_end_time(context):
+    return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
+
 class Show(db.Model):
     __tablename__ = "Show"
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        # the /shows feed order
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.Index('ix_show_updated_at', 'updated_at'),
+        # on PostgreSQL the migrations also add exclusion constraints over
+        # tsrange(start_time, end_time), per venue and per artist, so no two
+        # bookings of either can overlap
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 def __repr__(self):
     return f"<Show id={self.id} artist_id={self.artist_id} venue_id={self.venue_id} start_time={self.start_time}"
+
+# One row per deleted venue or artist. Deletes lower row counts without
+# moving any remaining updated_at, so the page versions in queries.py read
+# the latest deleted_at here for their Last-Modified.
+class Deletion(db.Model):
+    __tablename__ = "Deletion"
+    __table_args__ = (
+        db.Index('ix_deletion_table_name_deleted_at', 'table_name', 'deleted_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+# Precomputed venue/artist matches (see matching.py), replaced as a whole by
+# `flask fyyur rebuild-matches`. A pair is kept when it is among the best
+# MATCHES_PER_OWNER of either side: venue_rank orders the artists suggested
+# to the venue, artist_rank the venues suggested to the artist, and the
+# other rank is null when the pair only made one side's list.
+class Match(db.Model):
+    __tablename__ = "Match"
+    __table_args__ = (
+        db.Index('ix_match_venue_id_venue_rank', 'venue_id', 'venue_rank'),
+        db.Index('ix_match_artist_id_artist_rank', 'artist_id', 'artist_rank'),
+    )
+
+    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id", ondelete="CASCADE"), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id", ondelete="CASCADE"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    venue_rank = db.Column(db.Integer)
+    artist_rank = db.Column(db.Integer)
@@ -0,0 +1,553 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import base64
+import json
+from datetime import datetime, timezone
+from itertools import groupby
+
+from sqlalchemy import and_, case, func, insert, literal, or_, select, tuple_, union_all, update
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+from cache import cache_tags
+from models import db, Venue, Artist, Show, Genre, Deletion, venue_genres, artist_genres
+
+#----------------------------------------------------------------------------#
+# Load profiles.
+#----------------------------------------------------------------------------#
+
+# Columns rendered by the detail pages and pre-filled into the edit forms.
+VENUE_PROFILE_COLUMNS = (
+    Venue.id, Venue.name, Venue.address, Venue.city, Venue.state,
+    Venue.phone, Venue.website, Venue.facebook_link, Venue.seeking_talent,
+    Venue.seeking_description, Venue.image_link,
+)
+ARTIST_PROFILE_COLUMNS = (
+    Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+    Artist.website, Artist.facebook_link, Artist.seeking_venue,
+    Artist.seeking_description, Artist.image_link,
+)
+
+# Named loader options per model. Each view asks for the columns and
+# relationships it needs; anything else raises instead of lazy loading.
+LOAD_PROFILES = {
+    Venue: {
+        "listing": (load_only(Venue.id, Venue.name, Venue.city, Venue.state), raiseload("*")),
+        "detail": (load_only(*VENUE_PROFILE_COLUMNS), selectinload(Venue.genres), raiseload("*")),
+        "edit": (load_only(*VENUE_PROFILE_COLUMNS), selectinload(Venue.genres), raiseload("*")),
+        # delete-orphan cascades need the shows, fetched in one extra SELECT
+        # with both foreign keys, which the unit of work reads on delete
+        "delete": (selectinload(Venue.shows).load_only(Show.id, Show.venue_id, Show.artist_id),),
+    },
+    Artist: {
+        "listing": (load_only(Artist.id, Artist.name), raiseload("*")),
+        "detail": (load_only(*ARTIST_PROFILE_COLUMNS), selectinload(Artist.genres), raiseload("*")),
+        "edit": (load_only(*ARTIST_PROFILE_COLUMNS), selectinload(Artist.genres), raiseload("*")),
+        "delete": (selectinload(Artist.shows).load_only(Show.id, Show.venue_id, Show.artist_id),),
+    },
+}
+
+
+def load_profile(model, profile):
+    # `model.query` restricted to the loader options of a named profile,
+    # e.g. load_profile(Venue, "detail").filter(Venue.id == venue_id).first()
+    try:
+        options = LOAD_PROFILES[model][profile]
+    except KeyError:
+        raise ValueError(f"unknown load profile {profile!r} for {model.__name__}")
+    return db.session.query(model).options(*options)
+
+#----------------------------------------------------------------------------#
+# Genres.
+#----------------------------------------------------------------------------#
+
+def genres_named(names):
+    # Genre rows for `names`, creating any that do not exist yet
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    if not names:
+        return []
+    genres = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names))}
+    for name in names:
+        if name not in genres:
+            genres[name] = Genre(name=name)
+            db.session.add(genres[name])
+    return [genres[name] for name in names]
+
+
+def venues_with_genre(name):
+    # criterion for venue queries, answered from the (genre_id, venue_id) index
+    return Venue.id.in_(
+        select(venue_genres.c.venue_id)
+        .join(Genre, Genre.id == venue_genres.c.genre_id)
+        .where(Genre.name == name)
+    )
+
+
+def artists_with_genre(name):
+    # criterion for artist queries, answered from the (genre_id, artist_id) index
+    return Artist.id.in_(
+        select(artist_genres.c.artist_id)
+        .join(Genre, Genre.id == artist_genres.c.genre_id)
+        .where(Genre.name == name)
+    )
+
+#----------------------------------------------------------------------------#
+# Show counts.
+#----------------------------------------------------------------------------#
+
+def show_counts(key, now=None):
+    # one row per venue/artist id with its upcoming and past show counts,
+    # aggregated by the database in a single GROUP BY over Show.
+    if now is None:
+        now = datetime.now()
+    return (
+        db.session.query(
+            key.label("owner_id"),
+            func.sum(case((Show.start_time > now, 1), else_=0)).label("num_upcoming_shows"),
+            func.sum(case((Show.start_time > now, 0), else_=1)).label("num_past_shows"),
+        )
+        .group_by(key)
+        .subquery()
+    )
+
+
+def correlated_show_count(key, owner_id, upcoming, now):
+    # COUNT of one owner's upcoming or past shows, evaluated per outer row.
+    # Cheaper than show_counts when only a page of owners is selected.
+    split = Show.start_time > now if upcoming else Show.start_time <= now
+    return (
+        select(func.count(Show.id))
+        .where(key == owner_id, split)
+        .correlate_except(Show)
+        .scalar_subquery()
+    )
+
+
+def _summaries(columns, key, owner_id, criteria, now, correlated):
+    if now is None:
+        now = datetime.now()
+    if correlated:
+        query = db.session.query(
+            *columns,
+            correlated_show_count(key, owner_id, True, now).label("num_upcoming_shows"),
+            correlated_show_count(key, owner_id, False, now).label("num_past_shows"),
+        )
+    else:
+        counts = show_counts(key, now)
+        query = db.session.query(
+            *columns,
+            func.coalesce(counts.c.num_upcoming_shows, 0).label("num_upcoming_shows"),
+            func.coalesce(counts.c.num_past_shows, 0).label("num_past_shows"),
+        ).outerjoin(counts, counts.c.owner_id == owner_id)
+    return query.filter(*criteria)
+
+
+def venue_summaries(*criteria, now=None, correlated=False):
+    # id, name, city, state, num_upcoming_shows and num_past_shows for every
+    # venue matching `criteria`, in a single statement. Pass correlated=True
+    # when the query will be limited to a page of venues.
+    return _summaries(
+        (Venue.id, Venue.name, Venue.city, Venue.state),
+        Show.venue_id, Venue.id, criteria, now, correlated
+    )
+
+
+def artist_summaries(*criteria, now=None, correlated=False):
+    # id, name, num_upcoming_shows and num_past_shows for every artist
+    # matching `criteria`, in a single statement.
+    return _summaries(
+        (Artist.id, Artist.name),
+        Show.artist_id, Artist.id, criteria, now, correlated
+    )
+
+#----------------------------------------------------------------------------#
+# Venue areas.
+#----------------------------------------------------------------------------#
+
+VENUE_AREA_KEYS = (Venue.state, Venue.city, Venue.id)
+
+
+def venue_areas(*criteria, now=None):
+    # areas -> venues -> num_upcoming_shows as consumed by pages/venues.html
+    return group_areas(venue_summaries(*criteria, now=now).order_by(*VENUE_AREA_KEYS))
+
+
+def venue_area_page(*criteria, after=None, before=None, limit=50, now=None):
+    # one keyset page of venue_areas, ordered by (state, city, id); an area
+    # may continue on the next page
+    page = KeysetPage(
+        venue_summaries(*criteria, now=now, correlated=True), VENUE_AREA_KEYS,
+        lambda row: (row.state, row.city, row.id), (str, str, int),
+        after=after, before=before, limit=limit
+    )
+    return group_areas(page.rows), page
+
+
+def artist_page(*criteria, after=None, before=None, limit=50):
+    # one keyset page of (id, name) artists, ordered by (name, id)
+    return KeysetPage(
+        db.session.query(Artist.id, Artist.name).filter(*criteria), (Artist.name, Artist.id),
+        lambda row: (row.name, row.id), (str, int),
+        after=after, before=before, limit=limit
+    )
+
+
+def group_areas(rows):
+    # rows ordered by area, grouped in one pass
+    areas = []
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in venues]
+        })
+    return areas
+
+#----------------------------------------------------------------------------#
+# Detail page shows.
+#----------------------------------------------------------------------------#
+
+def show_timeline(key, owner_id, other, other_key, now=None, past_limit=20, upcoming_limit=20):
+    # The last `past_limit` and next `upcoming_limit` shows of one venue or
+    # artist, split at a single `now`, joined to the other side of the show
+    # and ordered by start_time, plus the full past/upcoming counts. All in
+    # one statement: both windows read only their slice of the
+    # (owner, start_time) index and the counts are uncorrelated scalar
+    # subqueries the database evaluates once.
+    if now is None:
+        now = datetime.now()
+    past = Show.start_time <= now
+    upcoming = Show.start_time > now
+
+    def window(split, is_upcoming, order, limit):
+        rows = (
+            select(Show.id, Show.start_time, other_key.label("other_id"),
+                   literal(is_upcoming).label("upcoming"))
+            .where(key == owner_id, split)
+            .order_by(*order)
+            .limit(limit)
+            .subquery()
+        )
+        return select(rows)
+
+    def total(split):
+        return select(func.count(Show.id)).where(key == owner_id, split).scalar_subquery()
+
+    shows = union_all(
+        window(past, False, (Show.start_time.desc(), Show.id.desc()), past_limit),
+        window(upcoming, True, (Show.start_time, Show.id), upcoming_limit),
+    ).subquery()
+    rows = db.session.execute(
+        select(
+            shows,
+            other.name.label("other_name"),
+            other.image_link.label("other_image_link"),
+            total(past).label("past_shows_count"),
+            total(upcoming).label("upcoming_shows_count"),
+        )
+        .join(other, other.id == shows.c.other_id)
+        .order_by(shows.c.start_time, shows.c.id)
+    ).all()
+
+    # with both windows empty there are no rows to carry the counts. With
+    # positive limits both counts are then zero; a limit of 0 (a page that
+    # lists no past or no upcoming shows) needs them read separately.
+    if rows:
+        counts = rows[0].past_shows_count, rows[0].upcoming_shows_count
+    elif past_limit > 0 and upcoming_limit > 0:
+        counts = 0, 0
+    else:
+        counts = db.session.execute(select(total(past), total(upcoming))).one()
+    return {
+        "past_shows": [row for row in rows if not row.upcoming],
+        "upcoming_shows": [row for row in rows if row.upcoming],
+        "past_shows_count": counts[0],
+        "upcoming_shows_count": counts[1],
+    }
+
+
+def venue_shows(venue_id, now=None, past_limit=20, upcoming_limit=20):
+    # show_timeline for a venue page, with artist fields keyed as in
+    # pages/show_venue.html
+    timeline = show_timeline(Show.venue_id, venue_id, Artist, Show.artist_id,
+                             now, past_limit, upcoming_limit)
+    for split in ("past_shows", "upcoming_shows"):
+        timeline[split] = [{
+            "artist_id": show.other_id,
+            "artist_name": show.other_name,
+            "artist_image_link": show.other_image_link,
+            "start_time": show.start_time
+        } for show in timeline[split]]
+    return timeline
+
+
+def artist_shows(artist_id, now=None, past_limit=20, upcoming_limit=20):
+    # show_timeline for an artist page, with venue fields keyed as in
+    # pages/show_artist.html
+    timeline = show_timeline(Show.artist_id, artist_id, Venue, Show.venue_id,
+                             now, past_limit, upcoming_limit)
+    for split in ("past_shows", "upcoming_shows"):
+        timeline[split] = [{
+            "venue_id": show.other_id,
+            "venue_name": show.other_name,
+            "venue_image_link": show.other_image_link,
+            "start_time": show.start_time
+        } for show in timeline[split]]
+    return timeline
+
+#----------------------------------------------------------------------------#
+# Keyset cursors.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(*values):
+    # opaque, url-safe token for the sort key of the last row on a page.
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, *types):
+    # inverse of encode_cursor; returns None for a missing or malformed token
+    # so a bad link simply restarts from the first page.
+    if not token:
+        return None
+    try:
+        parts = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(parts, list) or len(parts) != len(types):
+            return None
+        return tuple(
+            None if part is None else datetime.fromisoformat(part) if kind is datetime else kind(part)
+            for kind, part in zip(types, parts)
+        )
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    # One page of `query` ordered by the `keys` columns, starting after or
+    # ending before a cursor. `key_of` extracts the key values from a row.
+    # Each page costs one indexed range scan of limit + 1 rows, however deep
+    # into the table it is.
+
+    def __init__(self, query, keys, key_of, types, after=None, before=None, limit=50):
+        key = tuple_(*keys)
+        before = decode_cursor(before, *types)
+        after = decode_cursor(after, *types)
+        if before is not None:
+            rows = (
+                query.filter(key < tuple_(*before))
+                .order_by(*(column.desc() for column in keys))
+                .limit(limit + 1)
+                .all()
+            )
+            has_prev, has_next = len(rows) > limit, True
+            rows = rows[:limit][::-1]
+        else:
+            if after is not None:
+                query = query.filter(key > tuple_(*after))
+            rows = query.order_by(*keys).limit(limit + 1).all()
+            has_prev, has_next = after is not None, len(rows) > limit
+            rows = rows[:limit]
+        self.rows = rows
+        self.prev_cursor = encode_cursor(*key_of(rows[0])) if has_prev and rows else None
+        self.next_cursor = encode_cursor(*key_of(rows[-1])) if has_next and rows else None
+
+#----------------------------------------------------------------------------#
+# Shows feed.
+#----------------------------------------------------------------------------#
+
+def show_rows(*criteria):
+    # show, artist and venue columns in one joined statement.
+    return (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.end_time,
+            Show.venue_id,
+            Venue.name.label("venue_name"),
+            Show.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+        .filter(*criteria)
+    )
+
+
+def booking_venue(venue_id, artist_id):
+    # the venue's city and state, and whether the artist exists, in one
+    # statement; None when there is no such venue
+    artist_found = select(Artist.id).where(Artist.id == artist_id).exists().label("artist_found")
+    return (
+        db.session.query(Venue.city, Venue.state, artist_found)
+        .filter(Venue.id == venue_id)
+        .one_or_none()
+    )
+
+
+class ShowFeed:
+    # one page of the shows feed, ordered by (start_time, id).
+    #
+    # Rows are pulled from the cursor while the template iterates, so the
+    # page can be streamed; `next_cursor` is known once iteration is done.
+
+    def __init__(self, after=None, limit=60):
+        self.after = decode_cursor(after, datetime, int)
+        self.limit = limit
+        self.next_cursor = None
+
+    def query(self):
+        query = show_rows()
+        if self.after is not None:
+            start_time, show_id = self.after
+            query = query.filter(or_(
+                Show.start_time > start_time,
+                and_(Show.start_time == start_time, Show.id > show_id)
+            ))
+        return query.order_by(Show.start_time, Show.id).limit(self.limit + 1)
+
+    def __iter__(self):
+        last = None
+        for count, show in enumerate(self.query().yield_per(100)):
+            if count == self.limit:
+                self.next_cursor = encode_cursor(last.start_time, last.id)
+                break
+            last = show
+            cache_tags(f"venue:{show.venue_id}", f"artist:{show.artist_id}")
+            yield {
+                "venue_id": show.venue_id,
+                "venue_name": show.venue_name,
+                "artist_id": show.artist_id,
+                "artist_name": show.artist_name,
+                "artist_image_link": show.artist_image_link,
+                "start_time": show.start_time
+            }
+
+#----------------------------------------------------------------------------#
+# Versions.
+#----------------------------------------------------------------------------#
+
+# What a page shows, reduced to a few values read in one statement of index
+# lookups and no ORM objects, so a conditional GET can be answered without
+# loading the page (see conditional_page in cache.py). Each function returns
+# (last_modified, values), or None when the page does not exist; `values`
+# change whenever the page can:
+# - `*_updated`, the latest updated_at of the rows shown. Edits set it, and a
+#   new show moves the shows' maximum.
+# - row counts, which move on deletes. Shows are only deleted with their
+#   venue or artist, so those counts stand in for them.
+# - `*_deleted`, the latest time a venue or artist was deleted (see
+#   record_deletion), since a delete moves no remaining updated_at.
+# - `last_started`, the start of the latest show that has begun, for pages
+#   that split past from upcoming shows at the current time.
+# last_modified is the latest of those times, in UTC.
+
+def _latest(column, *criteria):
+    return select(func.max(column)).where(*criteria).scalar_subquery()
+
+
+def _count(column, *criteria):
+    return select(func.count(column)).where(*criteria).scalar_subquery()
+
+
+def _deleted(model):
+    return _latest(Deletion.deleted_at, Deletion.table_name == model.__tablename__)
+
+
+def _version(row):
+    if row is None:
+        return None
+    values = row._mapping
+    # updated_at and deleted_at are stored in UTC, start_time in local time
+    times = [value.replace(tzinfo=timezone.utc) for name, value in values.items()
+             if name.endswith(('_updated', '_deleted')) and value is not None]
+    if values.get('last_started') is not None:
+        times.append(values['last_started'].astimezone(timezone.utc))
+    return (max(times) if times else None), tuple(row)
+
+
+def venue_version(venue_id, now=None):
+    if now is None:
+        now = datetime.now()
+    return _version(db.session.execute(select(
+        Venue.updated_at.label('venue_updated'),
+        _latest(Show.updated_at, Show.venue_id == venue_id).label('shows_updated'),
+        _latest(Artist.updated_at, Artist.id == Show.artist_id, Show.venue_id == venue_id).label('artists_updated'),
+        _count(Show.id, Show.venue_id == venue_id).label('shows'),
+        _deleted(Artist).label('artists_deleted'),
+        _latest(Show.start_time, Show.venue_id == venue_id, Show.start_time <= now).label('last_started'),
+    ).where(Venue.id == venue_id)).first())
+
+
+def artist_version(artist_id, now=None):
+    if now is None:
+        now = datetime.now()
+    return _version(db.session.execute(select(
+        Artist.updated_at.label('artist_updated'),
+        _latest(Show.updated_at, Show.artist_id == artist_id).label('shows_updated'),
+        _latest(Venue.updated_at, Venue.id == Show.venue_id, Show.artist_id == artist_id).label('venues_updated'),
+        _count(Show.id, Show.artist_id == artist_id).label('shows'),
+        _deleted(Venue).label('venues_deleted'),
+        _latest(Show.start_time, Show.artist_id == artist_id, Show.start_time <= now).label('last_started'),
+    ).where(Artist.id == artist_id)).first())
+
+
+def venue_listing_version(now=None):
+    # every page of /venues, which counts upcoming shows
+    if now is None:
+        now = datetime.now()
+    return _version(db.session.execute(select(
+        _latest(Venue.updated_at).label('venues_updated'),
+        _latest(Show.updated_at).label('shows_updated'),
+        _count(Venue.id).label('venues'),
+        _deleted(Venue).label('venues_deleted'),
+        # shows are deleted with their artist, lowering the upcoming counts
+        _deleted(Artist).label('artists_deleted'),
+        _latest(Show.start_time, Show.start_time <= now).label('last_started'),
+    )).first())
+
+
+def artist_listing_version():
+    # every page of /artists
+    return _version(db.session.execute(select(
+        _latest(Artist.updated_at).label('artists_updated'),
+        _count(Artist.id).label('artists'),
+        _deleted(Artist).label('artists_deleted'),
+    )).first())
+
+
+def show_listing_version():
+    # every page of /shows
+    return _version(db.session.execute(select(
+        _latest(Show.updated_at).label('shows_updated'),
+        _latest(Venue.updated_at).label('venues_updated'),
+        _latest(Artist.updated_at).label('artists_updated'),
+        _count(Venue.id).label('venues'),
+        _count(Artist.id).label('artists'),
+        _deleted(Venue).label('venues_deleted'),
+        _deleted(Artist).label('artists_deleted'),
+    )).first())
+
+
+def record_deletion(model, row_id, now=None):
+    # note that a `model` row is being deleted, in the current transaction,
+    # for the versions above
+    db.session.execute(insert(Deletion).values(
+        table_name=model.__tablename__, row_id=row_id, deleted_at=now or datetime.utcnow()
+    ))
+
+
+def touch_venue_artists(venue_id, now=None):
+    # move the version of every artist with a show at the venue, whose pages
+    # lose those shows when the venue is deleted
+    db.session.execute(
+        update(Artist)
+        .where(Artist.id.in_(select(Show.artist_id).where(Show.venue_id == venue_id)))
+        .values(updated_at=now or datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
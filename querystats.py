@@ -0,0 +1,125 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL statistics.
+#----------------------------------------------------------------------------#
+
+# Every statement any engine runs inside a request is counted and timed
+# against that request, and fingerprinted so that the same statement sent
+# over and over (the usual N+1 shape) stands out. Responses carry the totals
+# in a Server-Timing header, the log gets a line per request, and endpoints
+# listed in QUERY_BUDGETS may be held to a statement count.
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN \((?:\s*(?:\?|%\(\w+\)s|%s)\s*,?)+\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(statement):
+    # the statement with literals and IN lists collapsed, so the same query
+    # with other values or a different number of ids compares equal
+    statement = _LITERALS.sub('?', statement)
+    statement = _IN_LISTS.sub('IN (...)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class QueryStats:
+
+    def __init__(self, endpoint, budget=None):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def duplicates(self, threshold):
+        # (fingerprint, times) for statements sent at least `threshold` times
+        return [(statement, times) for statement, times in self.fingerprints.most_common()
+                if times >= threshold]
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def server_timing(self, threshold):
+        timing = [f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"']
+        repeated = len(self.duplicates(threshold))
+        if repeated:
+            timing.append(f'db-dup;desc="{repeated} repeated statements"')
+        return ', '.join(timing)
+
+
+def current_stats():
+    return g.get('query_stats') if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is None:
+        return
+    stats.record(statement, time.perf_counter() - started)
+    if stats.over_budget and current_app.config['QUERY_BUDGET_ENFORCE']:
+        # raised here as well as after the request so streamed responses,
+        # whose statements run after the view returns, are held to it too
+        raise QueryBudgetExceeded(
+            f"{stats.endpoint} sent {stats.count} statements; its budget is {stats.budget}")
+
+
+def _log(logger, stats, threshold):
+    logger.debug("%s: %d queries in %.2f ms", stats.endpoint, stats.count, stats.duration * 1000)
+    for statement, times in stats.duplicates(threshold):
+        logger.warning("possible N+1 in %s: %d x %s", stats.endpoint, times, statement[:300])
+
+
+def init_query_stats(app):
+    if not app.config['QUERY_STATS_ENABLED']:
+        return
+    if not event.contains(Engine, 'after_cursor_execute', _after_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats(request.endpoint, app.config['QUERY_BUDGETS'].get(request.endpoint))
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        threshold = app.config['QUERY_DUPLICATE_THRESHOLD']
+        # for a streamed response these are the statements run so far; the
+        # log line below is written once the body has been sent
+        response.headers['Server-Timing'] = stats.server_timing(threshold)
+        if stats.over_budget and app.config['QUERY_BUDGET_ENFORCE']:
+            raise QueryBudgetExceeded(
+                f"{stats.endpoint} sent {stats.count} statements; its budget is {stats.budget}")
+        if response.is_streamed:
+            response.call_on_close(lambda: _log(app.logger, stats, threshold))
+        else:
+            _log(app.logger, stats, threshold)
+        return response
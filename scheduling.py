@@ -0,0 +1,224 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import timedelta
+from itertools import islice
+
+from sqlalchemy import insert, or_, select
+
+from models import db, Show, DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Interval tree.
+#----------------------------------------------------------------------------#
+
+class IntervalTree:
+    # A static interval tree over half-open [start, end) intervals: the
+    # intervals sorted by start form an implicit balanced binary tree (the
+    # middle of each slice is its root), and each node records the latest end
+    # in its subtree. A query skips every subtree that ends before it starts
+    # or starts after it ends, so finding the k overlaps of one interval
+    # takes O(log n + k) however many intervals there are.
+
+    def __init__(self, intervals):
+        # intervals: (start, end, value) tuples
+        self.intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.max_end = [None] * len(self.intervals)
+        self._build(0, len(self.intervals))
+
+    def _build(self, low, high):
+        if low >= high:
+            return None
+        middle = (low + high) // 2
+        latest = self.intervals[middle][1]
+        for end in (self._build(low, middle), self._build(middle + 1, high)):
+            if end is not None and end > latest:
+                latest = end
+        self.max_end[middle] = latest
+        return latest
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, start, end):
+        # the (start, end, value) tuples overlapping [start, end), by start
+        found = []
+        stack = [(0, len(self.intervals))]
+        while stack:
+            low, high = stack.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            if self.max_end[middle] <= start:
+                continue
+            stack.append((low, middle))
+            interval = self.intervals[middle]
+            if interval[0] < end:
+                if interval[1] > start:
+                    found.append(interval)
+                stack.append((middle + 1, high))
+        found.sort(key=lambda interval: interval[0])
+        return found
+
+#----------------------------------------------------------------------------#
+# Conflicts.
+#----------------------------------------------------------------------------#
+
+# PostgreSQL's exclusion_violation, raised by the constraints the migrations
+# add when a concurrent booking slipped past find_conflicts()
+EXCLUSION_VIOLATION = '23P01'
+
+SIDES = ('venue', 'artist')
+
+
+def show_duration(minutes=None):
+    # a show's length from a number of minutes, DEFAULT_SHOW_DURATION when
+    # not given; ValueError unless it is positive and at most MAX_SHOW_DURATION
+    if minutes is None or minutes == '':
+        return DEFAULT_SHOW_DURATION
+    duration = timedelta(minutes=int(minutes))
+    if not timedelta(0) < duration <= MAX_SHOW_DURATION:
+        raise ValueError(f"a show lasts between 1 and {MAX_SHOW_DURATION // timedelta(minutes=1)} minutes")
+    return duration
+
+
+def _describe(side, owner_id, start, end, show_id):
+    booked = f"{side} {owner_id} is already booked from {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}"
+    if show_id is None:
+        return f"{booked} by another show in this batch"
+    return f"{booked} (show {show_id})"
+
+
+def booked_intervals(shows):
+    # One (side, id) -> IntervalTree of the existing bookings that could
+    # overlap `shows`, for every venue and artist they name, read in one
+    # statement. A booking overlapping [start, end) starts before `end` and
+    # no earlier than MAX_SHOW_DURATION before `start`, so the statement is a
+    # range scan of the (venue_id, start_time) and (artist_id, start_time)
+    # indexes over that window, whatever the size of the calendar. Empty
+    # bookings (end_time == start_time, left by the migration that added
+    # end_time to duplicated shows) overlap nothing and are skipped.
+    owners = {side: {show[f'{side}_id'] for show in shows} for side in SIDES}
+    rows = db.session.execute(
+        select(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time)
+        .where(
+            or_(Show.venue_id.in_(owners['venue']), Show.artist_id.in_(owners['artist'])),
+            Show.start_time >= min(show['start_time'] for show in shows) - MAX_SHOW_DURATION,
+            Show.start_time < max(show['end_time'] for show in shows),
+            Show.end_time > Show.start_time
+        )
+    )
+    intervals = {}
+    for row in rows:
+        for side in SIDES:
+            owner_id = getattr(row, f'{side}_id')
+            if owner_id in owners[side]:
+                intervals.setdefault((side, owner_id), []).append((row.start_time, row.end_time, row.id))
+    return {key: IntervalTree(booked) for key, booked in intervals.items()}
+
+
+def find_conflicts(shows):
+    # Checks `shows`, dicts of venue_id, artist_id, start_time and end_time,
+    # against the bookings in the database and against each other. Returns
+    # {index in shows: message} for each show that would overlap another
+    # booking of its venue or its artist; of two overlapping new shows the
+    # one starting first is kept.
+    if not shows:
+        return {}
+    trees = booked_intervals(shows)
+    conflicts = {}
+    for index, show in enumerate(shows):
+        for side in SIDES:
+            tree = trees.get((side, show[f'{side}_id']))
+            overlaps = tree.overlapping(show['start_time'], show['end_time']) if tree else ()
+            if overlaps:
+                conflicts[index] = _describe(side, show[f'{side}_id'], *overlaps[0])
+                break
+
+    # the remaining shows, swept in start order: accepted bookings of one
+    # venue or artist never overlap, so a show overlaps one of them exactly
+    # when it starts before the last of them ends
+    last = {}
+    remaining = sorted((index for index in range(len(shows)) if index not in conflicts),
+                       key=lambda index: (shows[index]['start_time'], index))
+    for index in remaining:
+        show = shows[index]
+        keys = [(side, show[f'{side}_id']) for side in SIDES]
+        for key in keys:
+            booked = last.get(key)
+            if booked is not None and show['start_time'] < booked[1]:
+                conflicts[index] = _describe(*key, *booked, None)
+                break
+        else:
+            for key in keys:
+                last[key] = (show['start_time'], show['end_time'])
+    return conflicts
+
+
+def _lock_for_booking():
+    # SQLite has no exclusion constraints, and pysqlite only opens a
+    # transaction at the first INSERT, so find_conflicts() would read before
+    # the write lock is held and two bookings could both pass it. BEGIN
+    # IMMEDIATE takes the lock first; other writers wait for the commit.
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def book_shows(shows):
+    # Inserts `shows` in one multi-row INSERT, in the current transaction,
+    # unless find_conflicts() finds any; returns its result. On PostgreSQL
+    # the exclusion constraints still reject a booking made concurrently,
+    # with an IntegrityError that is_booking_conflict() recognises; on SQLite
+    # the check and the insert run under the database's write lock.
+    _lock_for_booking()
+    conflicts = find_conflicts(shows)
+    if not conflicts:
+        db.session.execute(insert(Show).values(shows))
+    return conflicts
+
+
+def is_booking_conflict(error):
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == EXCLUSION_VIOLATION
+
+#----------------------------------------------------------------------------#
+# Batches.
+#----------------------------------------------------------------------------#
+
+# dateutil is imported by the functions below, so web workers that never
+# create a batch skip it at boot
+
+def parse_start_times(text):
+    # one start time per non-blank line, in any format dateutil reads
+    import dateutil.parser
+
+    start_times = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            start_times.append(dateutil.parser.parse(line))
+        except (ValueError, OverflowError):
+            raise ValueError(f"line {number}: {line.strip()!r} is not a date and time")
+    return start_times
+
+
+def recurring_start_times(rule, first_start_time, limit):
+    # the start times an RFC 5545 recurrence rule (`FREQ=WEEKLY;COUNT=8`,
+    # with or without RRULE:, EXDATE lines allowed) gives from
+    # first_start_time; ValueError when there would be more than `limit`
+    import dateutil.rrule
+
+    if first_start_time is None:
+        raise ValueError("a recurrence needs a first start time")
+    try:
+        rule = dateutil.rrule.rrulestr(rule, dtstart=first_start_time, forceset=True)
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"not a recurrence rule: {error}")
+    start_times = list(islice(rule, limit + 1))
+    if len(start_times) > limit:
+        raise ValueError(f"the recurrence gives more than {limit} shows; end it with COUNT or UNTIL")
+    return start_times
@@ -0,0 +1,91 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import case, func, literal, or_
+
+from models import db, Venue, Artist
+from queries import venue_summaries, artist_summaries
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# On PostgreSQL the ILIKE filters below are answered by the pg_trgm GIN
+# indexes and the tsvector expressions by the full-text GIN indexes, both
+# created in migration 5b1f0c2a9d47. Any other database (SQLite in local
+# runs) gets the same matches from a plain LIKE scan and a simpler rank.
+
+TSVECTOR_CONFIG = 'simple'
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _like_pattern(term):
+    escaped = term.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+    return f"%{escaped}%"
+
+
+def _document(*columns):
+    # must match the indexed expression in the migration exactly
+    text = func.coalesce(columns[0], '')
+    for column in columns[1:]:
+        text = text.op('||')(' ').op('||')(func.coalesce(column, ''))
+    return func.to_tsvector(TSVECTOR_CONFIG, text)
+
+
+def _match_and_rank(term, name, *others):
+    pattern = _like_pattern(term)
+    columns = (name,) + others
+    substring = or_(*(column.ilike(pattern, escape='!') for column in columns))
+
+    if _is_postgres():
+        query = func.plainto_tsquery(TSVECTOR_CONFIG, term)
+        document = _document(*columns)
+        match = or_(substring, document.op('@@')(query))
+        rank = func.greatest(
+            *(func.word_similarity(term, column) for column in columns),
+            func.ts_rank(document, query)
+        )
+        return match, rank.desc()
+
+    # prefix matches on the name first, then substring matches on the name,
+    # then matches on any other column
+    lowered = term.lower()
+    rank = case(
+        (func.lower(name).like(_like_pattern(lowered)[1:], escape='!'), literal(0)),
+        (func.lower(name).like(_like_pattern(lowered), escape='!'), literal(1)),
+        else_=literal(2)
+    )
+    return substring, rank
+
+
+def _search(summaries, match, rank, name, key, limit, offset):
+    # one COUNT for the total and one statement for the page, whose show
+    # counts are correlated subqueries evaluated for the page rows only
+    query = summaries(match, correlated=True)
+    return {
+        "count": db.session.query(func.count(key)).filter(match).scalar(),
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.num_upcoming_shows,
+            "num_past_shows": row.num_past_shows
+        } for row in query.order_by(rank, name, key).limit(limit).offset(offset)],
+        "limit": limit,
+        "offset": offset
+    }
+
+
+def search_venues(term, limit=20, offset=0):
+    # ranked venues whose name, city or state contain `term`
+    match, rank = _match_and_rank(term, Venue.name, Venue.city, Venue.state)
+    return _search(venue_summaries, match, rank, Venue.name, Venue.id, limit, offset)
+
+
+def search_artists(term, limit=20, offset=0):
+    # ranked artists whose name contains `term`
+    match, rank = _match_and_rank(term, Artist.name)
+    return _search(artist_summaries, match, rank, Artist.name, Artist.id, limit, offset)
@@ -0,0 +1,173 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# N-gram index.
+#----------------------------------------------------------------------------#
+
+class NgramIndex:
+    # In-memory inverted index from every 1..n character gram of a document
+    # to the sorted ids of the documents containing it. Postings are kept as
+    # unsigned int arrays, so a posting costs 4 bytes per id instead of a
+    # Python int object.
+
+    def __init__(self, n=3):
+        self.n = n
+        self._postings = {}
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _grams(self, text):
+        grams = set()
+        for size in range(1, self.n + 1):
+            for start in range(len(text) - size + 1):
+                grams.add(text[start:start + size])
+        return grams
+
+    def add(self, doc_id, label, text):
+        # (re)index `text` under `doc_id`; `label` is what suggestions display
+        self.remove(doc_id)
+        text = text.lower()
+        self._documents[doc_id] = (label, text)
+        for gram in self._grams(text):
+            ids = self._postings.get(gram)
+            if ids is None:
+                self._postings[gram] = array('I', [doc_id])
+            else:
+                ids.insert(bisect_left(ids, doc_id), doc_id)
+
+    def remove(self, doc_id):
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return
+        for gram in self._grams(document[1]):
+            ids = self._postings[gram]
+            del ids[bisect_left(ids, doc_id)]
+            if not ids:
+                del self._postings[gram]
+
+    def _candidates(self, query):
+        # ids whose text holds every gram of the query, smallest posting first
+        size = min(len(query), self.n)
+        postings = []
+        for gram in {query[start:start + size] for start in range(len(query) - size + 1)}:
+            ids = self._postings.get(gram)
+            if ids is None:
+                return ()
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for ids in postings[1:]:
+            candidates = [doc_id for doc_id in candidates if _contains(ids, doc_id)]
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query, limit=10):
+        # prefix matches first, then other word-prefix matches, then any
+        # substring match; each group ordered by label
+        query = query.strip().lower()
+        if not query:
+            return []
+        ranked = []
+        for doc_id in self._candidates(query):
+            label, text = self._documents[doc_id]
+            position = text.find(query)
+            if position < 0:
+                continue
+            if position == 0:
+                rank = 0
+            elif not text[position - 1].isalnum():
+                rank = 1
+            else:
+                rank = 2
+            ranked.append((rank, label.lower(), doc_id, label))
+        return [{"id": doc_id, "name": label} for _, _, doc_id, label in heapq.nsmallest(limit, ranked)]
+
+
+def _contains(ids, doc_id):
+    position = bisect_left(ids, doc_id)
+    return position < len(ids) and ids[position] == doc_id
+
+#----------------------------------------------------------------------------#
+# Venue and artist suggestions.
+#----------------------------------------------------------------------------#
+
+def venue_document(venue):
+    return " ".join(part for part in (venue.name, venue.city, venue.state) if part)
+
+
+def artist_document(artist):
+    return artist.name or ""
+
+
+class SuggestIndex:
+    # Venue and artist n-gram indexes for typeahead suggestions.
+    #
+    # Built from the database on first use and kept current by the
+    # create/edit/delete handlers. Each worker process holds its own copy, so
+    # writes made by other workers are picked up by a rebuild once the copy
+    # is older than `max_age` seconds (never, when max_age is None).
+
+    def __init__(self, n=3, max_age=None):
+        self.n = n
+        self.max_age = max_age
+        self.venues = NgramIndex(n)
+        self.artists = NgramIndex(n)
+        self.built_at = None
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        venues, artists = NgramIndex(self.n), NgramIndex(self.n)
+        for venue in db.session.query(Venue.id, Venue.name, Venue.city, Venue.state).yield_per(1000):
+            venues.add(venue.id, venue.name or "", venue_document(venue))
+        for artist in db.session.query(Artist.id, Artist.name).yield_per(1000):
+            artists.add(artist.id, artist.name or "", artist_document(artist))
+        with self._lock:
+            self.venues, self.artists = venues, artists
+            self.built_at = time.monotonic()
+
+    def ensure_built(self):
+        if self.built_at is None or (
+                self.max_age is not None and time.monotonic() - self.built_at > self.max_age):
+            self.rebuild()
+
+    def suggest(self, query, limit=10):
+        self.ensure_built()
+        # updates change the postings in place, so searches hold the lock too
+        with self._lock:
+            return {
+                "venues": self.venues.search(query, limit),
+                "artists": self.artists.search(query, limit)
+            }
+
+    def update_venue(self, venue):
+        if self.built_at is not None:
+            with self._lock:
+                self.venues.add(venue.id, venue.name or "", venue_document(venue))
+
+    def remove_venue(self, venue_id):
+        if self.built_at is not None:
+            with self._lock:
+                self.venues.remove(venue_id)
+
+    def update_artist(self, artist):
+        if self.built_at is not None:
+            with self._lock:
+                self.artists.add(artist.id, artist.name or "", artist_document(artist))
+
+    def remove_artist(self, artist_id):
+        if self.built_at is not None:
+            with self._lock:
+                self.artists.remove(artist_id)
@@ -0,0 +1,7 @@
+#----------------------------------------------------------------------------#
+# WSGI entry point, e.g. `gunicorn wsgi:app` (settings in gunicorn.conf.py).
+#----------------------------------------------------------------------------#
+
+from app import create_app
+
+app = create_app()